@@ -0,0 +1,201 @@
+"""
+Cache partagé des réponses publiques (valeurs `bytes`, invalidation par tag).
+
+Deux backends, choisis par `CACHE_BACKEND` :
+- `memory` (défaut) : LRU en mémoire du processus, borné à `CACHE_MAXSIZE`
+  entrées ;
+- `redis` : un Redis local (`REDIS_URL`), partagé par tous les workers.
+  Nécessite le paquet `redis` (`pip install redis`), qui n'est pas dans
+  `requirements.txt`.
+
+Chaque entrée porte des tags ; `invalidate(*tags)` supprime toutes les
+entrées d'un tag. Les tags sont les clés de version du catalogue
+(`app/services/versions_services.py`) : `bump` invalide le cache à chaque
+écriture. Avec le backend `memory`, seules les entrées du worker qui a fait
+l'écriture sont invalidées ; dans les autres, les réponses publiques ne les
+relisent plus car leur clé contient l'ETag, donc les versions
+(`app/utils/http_cache.py`), et elles expirent au bout de leur TTL.
+
+Une erreur du backend (Redis indisponible) n'est jamais propagée : la
+lecture devient un échec de cache et la requête part vers MongoDB.
+"""
+
+import os
+import time
+from collections import defaultdict
+from typing import Dict, Iterable, Optional, Set, Tuple
+
+from cachetools import LRUCache
+from dotenv import load_dotenv
+
+from app.core import metrics
+
+load_dotenv()
+
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", default="memory")
+CACHE_MAXSIZE = int(os.getenv("CACHE_MAXSIZE", default=10000))
+REDIS_URL = os.getenv("REDIS_URL", default="redis://localhost:6379/0")
+
+
+class _EvictingLRU(LRUCache):
+    """`LRUCache` qui prévient son propriétaire des entrées évincées."""
+
+    def __init__(self, maxsize: int, on_evict):
+        super().__init__(maxsize=maxsize)
+        self._on_evict = on_evict
+
+    def popitem(self):
+        key, value = super().popitem()
+        self._on_evict(key, value)
+        return key, value
+
+
+class MemoryBackend:
+    def __init__(self, maxsize: int = CACHE_MAXSIZE):
+        # Clé -> (expiration, tags, valeur)
+        self._entries = _EvictingLRU(maxsize, self._untag)
+        self._keys_by_tag: Dict[str, Set[str]] = defaultdict(set)
+
+    def _untag(self, key: str, entry: Tuple[float, Tuple[str, ...], bytes]) -> None:
+        for tag in entry[1]:
+            keys = self._keys_by_tag.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._keys_by_tag[tag]
+
+    async def get(self, key: str) -> Optional[bytes]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= time.monotonic():
+            self._untag(key, self._entries.pop(key))
+            return None
+        return entry[2]
+
+    async def set(self, key: str, value: bytes, ttl: int, tags: Iterable[str]) -> None:
+        tags = tuple(tags)
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self._untag(key, previous)
+        self._entries[key] = (time.monotonic() + ttl, tags, value)
+        for tag in tags:
+            self._keys_by_tag[tag].add(key)
+
+    async def invalidate(self, tags: Iterable[str]) -> int:
+        count = 0
+        for tag in tags:
+            for key in self._keys_by_tag.pop(tag, ()):
+                entry = self._entries.pop(key, None)
+                if entry is not None:
+                    self._untag(key, entry)
+                    count += 1
+        return count
+
+    async def close(self) -> None:
+        self._entries.clear()
+        self._keys_by_tag.clear()
+
+
+class RedisBackend:
+    """
+    Entrées sous `cache:<clé>` (avec expiration) et, pour chaque tag, un
+    ensemble `cache-tag:<tag>` des clés à supprimer lors de son invalidation.
+    """
+
+    def __init__(self, url: str = REDIS_URL):
+        import redis.asyncio as redis
+
+        self._redis = redis.from_url(url)
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return await self._redis.get(f"cache:{key}")
+
+    async def set(self, key: str, value: bytes, ttl: int, tags: Iterable[str]) -> None:
+        async with self._redis.pipeline(transaction=False) as pipe:
+            pipe.set(f"cache:{key}", value, ex=ttl)
+            for tag in tags:
+                pipe.sadd(f"cache-tag:{tag}", f"cache:{key}")
+                # L'ensemble expire avec la plus durable de ses entrées
+                # (options NX/GT d'EXPIRE : Redis >= 7.0)
+                pipe.expire(f"cache-tag:{tag}", ttl, nx=True)
+                pipe.expire(f"cache-tag:{tag}", ttl, gt=True)
+            await pipe.execute()
+
+    async def invalidate(self, tags: Iterable[str]) -> int:
+        count = 0
+        for tag in tags:
+            keys = await self._redis.smembers(f"cache-tag:{tag}")
+            if keys:
+                count += await self._redis.delete(*keys)
+            await self._redis.delete(f"cache-tag:{tag}")
+        return count
+
+    async def close(self) -> None:
+        await self._redis.aclose()
+
+
+_backend = None
+# Nombre d'invalidations faites par ce processus (voir `invalidation_count`)
+_invalidations = 0
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        _backend = RedisBackend() if CACHE_BACKEND == "redis" else MemoryBackend()
+    return _backend
+
+
+def set_backend(backend) -> None:
+    """Remplace le backend (ex. `MemoryBackend()` dans les tests)."""
+    global _backend
+    _backend = backend
+
+
+async def fetch(key: str) -> Optional[bytes]:
+    try:
+        return await get_backend().get(key)
+    except Exception as e:
+        metrics.incr("cache.errors")
+        print(f"Erreur de lecture du cache : {e}")
+        return None
+
+
+async def store(key: str, value: bytes, ttl: int, tags: Iterable[str]) -> None:
+    try:
+        await get_backend().set(key, value, ttl, tags)
+    except Exception as e:
+        metrics.incr("cache.errors")
+        print(f"Erreur d'écriture du cache : {e}")
+
+
+def invalidation_count() -> int:
+    """
+    Compteur des invalidations locales. Une valeur lue en base avant une
+    invalidation ne doit pas être mise en cache après elle : l'appelant relève
+    ce compteur avant la lecture et n'écrit dans le cache que s'il n'a pas
+    bougé.
+    """
+    return _invalidations
+
+
+async def invalidate(*tags: str) -> None:
+    """Supprime du cache toutes les entrées portant l'un des `tags`."""
+    global _invalidations
+    _invalidations += 1
+    try:
+        count = await get_backend().invalidate(tags)
+    except Exception as e:
+        metrics.incr("cache.errors")
+        print(f"Erreur d'invalidation du cache : {e}")
+        return
+    if count:
+        metrics.incr("cache.invalidated", count)
+
+
+async def close() -> None:
+    global _backend
+    if _backend is not None:
+        await _backend.close()
+        _backend = None
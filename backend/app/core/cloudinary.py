@@ -1,9 +1,28 @@
+"""
+Téléversement des images vers Cloudinary.
+
+`cloudinary.uploader.upload` est synchrone : il est exécuté dans un pool de
+threads borné (`UPLOAD_WORKERS`) pour ne pas bloquer la boucle d'événements,
+et les images d'une même requête partent en parallèle, au plus
+`UPLOAD_CONCURRENCY` à la fois. Chaque image est lue directement depuis le
+fichier temporaire de l'`UploadFile`, sans copie intermédiaire en mémoire.
+
+L'uploader peut être remplacé (ex. par un stub local dans les tests) via
+`set_uploader`.
+"""
+
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import BinaryIO, Callable
+
 import cloudinary
 from cloudinary.uploader import upload
-from fastapi import HTTPException, UploadFile
 from dotenv import load_dotenv
-import os
-import io
+from fastapi import HTTPException, UploadFile
+
+from app.core import metrics
 
 load_dotenv()
 
@@ -14,22 +33,59 @@ cloudinary.config(
     secure=True,
 )
 
+UPLOAD_WORKERS = int(os.getenv("UPLOAD_WORKERS", default=8))
+# Nombre maximal d'images téléversées en parallèle pour une même requête
+UPLOAD_CONCURRENCY = int(os.getenv("UPLOAD_CONCURRENCY", default=4))
+
+_executor = ThreadPoolExecutor(
+    max_workers=UPLOAD_WORKERS, thread_name_prefix="cloudinary-upload"
+)
+
+# Signature : (fichier, nom du fichier) -> URL publique de l'image
+Uploader = Callable[[BinaryIO, str], str]
+
+
+def cloudinary_uploader(file: BinaryIO, filename: str) -> str:
+    result = upload(file=file, filename=filename, folder="shops/", resource_type="auto")
+    return result["secure_url"]
+
+
+_uploader: Uploader = cloudinary_uploader
+
+
+def set_uploader(uploader: Uploader) -> None:
+    """Remplace l'uploader utilisé par `upload_images_to_cloudinary`."""
+    global _uploader
+    _uploader = uploader
+
+
+def _upload_one(image: UploadFile) -> str:
+    started = time.perf_counter()
+    try:
+        image.file.seek(0)
+        return _uploader(image.file, image.filename or "image")
+    finally:
+        metrics.observe("uploads.image", time.perf_counter() - started)
+
 
 async def upload_images_to_cloudinary(images: list[UploadFile]) -> list[str]:
-    urls = []
     for image in images:
-        contents = await image.read()
-        if not contents:
+        if image.size == 0:
             raise HTTPException(status_code=400, detail="Fichier vide")
-        file_like = io.BytesIO(contents)
-        file_like.name = image.filename
-        file_like.seek(0)
-        try:
-            result = upload(file=file_like, folder="shops/", resource_type="auto")
-            urls.append(result["secure_url"])
-        except Exception as e:
-            print(f"Erreur Cloudinary: {e}")
-            raise HTTPException(
-                status_code=500, detail=f"Erreur lors de l'upload des images: {e}"
-            )
-    return urls
+
+    loop = asyncio.get_running_loop()
+    semaphore = asyncio.Semaphore(UPLOAD_CONCURRENCY)
+
+    async def upload_image(image: UploadFile) -> str:
+        async with semaphore:
+            return await loop.run_in_executor(_executor, _upload_one, image)
+
+    try:
+        # Les URL sont renvoyées dans l'ordre des images reçues
+        return await asyncio.gather(*(upload_image(image) for image in images))
+    except Exception as e:
+        metrics.incr("uploads.failed")
+        print(f"Erreur Cloudinary: {e}")
+        raise HTTPException(
+            status_code=500, detail=f"Erreur lors de l'upload des images: {e}"
+        )
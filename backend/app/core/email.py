@@ -1,46 +1,245 @@
+"""
+Envoi des emails via une boîte d'envoi (outbox) MongoDB.
+
+Les routes n'envoient plus rien elles-mêmes : `enqueue_email` insère le
+message dans la collection `outbox` et rend la main immédiatement. Un worker
+d'arrière-plan (démarré dans le lifespan) vide la boîte par lots en
+réutilisant une seule connexion SMTP authentifiée, et replanifie les échecs
+avec un backoff exponentiel.
+
+Pour tester contre un serveur SMTP local (ex. `python -m aiosmtpd -n -l
+localhost:1025`) : SMTP_HOST=localhost SMTP_PORT=1025 SMTP_STARTTLS=false,
+sans GMAIL_APP_PASSWORD.
+"""
+
+import asyncio
 import os
 import smtplib
+from datetime import datetime, timedelta
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
+from typing import Optional
+
 from dotenv import load_dotenv
+from pymongo import ReturnDocument
+
+from app.core import metrics
+from app.db.database import outbox
 
 load_dotenv()
 
 SENDER_EMAIL = os.getenv("SENDER_EMAIL")
 GMAIL_APP_PASSWORD = os.getenv("GMAIL_APP_PASSWORD")
+SMTP_HOST = os.getenv("SMTP_HOST", default="smtp.gmail.com")
+SMTP_PORT = int(os.getenv("SMTP_PORT", default=587))
+SMTP_STARTTLS = os.getenv("SMTP_STARTTLS", default="true").lower() == "true"
 
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", default=50))
+OUTBOX_POLL_SECONDS = float(os.getenv("OUTBOX_POLL_SECONDS", default=10))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", default=6))
+OUTBOX_BACKOFF_SECONDS = int(os.getenv("OUTBOX_BACKOFF_SECONDS", default=30))
+# Durée après laquelle un message "sending" abandonné (worker arrêté) est repris
+OUTBOX_LEASE_SECONDS = 300
 
-async def send_email(to_email: str, subject: str, html_content: str):
+_wake_up = asyncio.Event()
+_worker: Optional[asyncio.Task] = None
+
+
+def _outbox_document(to_email: str, subject: str, html_content: str) -> dict:
+    now = datetime.utcnow()
+    return {
+        "to_email": to_email,
+        "subject": subject,
+        "html_content": html_content,
+        "status": "pending",
+        "attempts": 0,
+        "next_attempt_at": now,
+        "created_at": now,
+    }
+
+
+async def enqueue_email(to_email: str, subject: str, html_content: str) -> None:
     """
-    Envoie un email en utilisant le serveur SMTP de Gmail.
+    Place un email dans la boîte d'envoi ; il sera envoyé par le worker.
     """
-    if not SENDER_EMAIL or not GMAIL_APP_PASSWORD:
-        print(
-            "ERREUR : Les variables d'environnement pour l'email ne sont pas configurées."
-        )
+    await outbox.insert_one(_outbox_document(to_email, subject, html_content))
+    metrics.incr("outbox.enqueued")
+    _wake_up.set()
+
+
+async def enqueue_emails(messages: list[dict]) -> None:
+    """
+    Place plusieurs emails (`to_email`, `subject`, `html_content`) dans la
+    boîte d'envoi en une seule écriture.
+    """
+    if not messages:
         return
+    await outbox.insert_many([_outbox_document(**message) for message in messages])
+    metrics.incr("outbox.enqueued", len(messages))
+    _wake_up.set()
 
-    # Création du message
+
+def _build_message(document: dict) -> MIMEMultipart:
     msg = MIMEMultipart("alternative")
-    msg["Subject"] = subject
+    msg["Subject"] = document["subject"]
     msg["From"] = SENDER_EMAIL
-    msg["To"] = to_email
-
+    msg["To"] = document["to_email"]
     # On attache le contenu HTML
-    part = MIMEText(html_content, "html")
-    msg.attach(part)
+    msg.attach(MIMEText(document["html_content"], "html"))
+    return msg
+
+
+class SMTPSession:
+    """Connexion SMTP ouverte à la demande et réutilisée pour tout un lot."""
+
+    def __init__(self):
+        self._server: Optional[smtplib.SMTP] = None
 
+    def _connect(self) -> smtplib.SMTP:
+        server = smtplib.SMTP(SMTP_HOST, SMTP_PORT, timeout=30)
+        if SMTP_STARTTLS:
+            server.starttls()  # Sécurisation de la connexion
+        if GMAIL_APP_PASSWORD:
+            server.login(SENDER_EMAIL, GMAIL_APP_PASSWORD)
+        metrics.incr("outbox.smtp_connections")
+        return server
+
+    def send(self, msg: MIMEMultipart) -> None:
+        if self._server is None:
+            self._server = self._connect()
+        try:
+            self._server.send_message(msg)
+        except smtplib.SMTPServerDisconnected:
+            # Connexion fermée par le serveur entre deux lots : on la rouvre
+            self._server = self._connect()
+            self._server.send_message(msg)
+
+    def close(self) -> None:
+        if self._server is not None:
+            try:
+                self._server.quit()
+            except (smtplib.SMTPException, OSError):
+                # Connexion déjà coupée : il n'y a plus rien à fermer
+                pass
+            self._server = None
+
+
+async def _claim_next() -> Optional[dict]:
+    """Réserve atomiquement le prochain message à envoyer."""
+    now = datetime.utcnow()
+    return await outbox.find_one_and_update(
+        {
+            "$or": [
+                {"status": "pending", "next_attempt_at": {"$lte": now}},
+                {"status": "sending", "locked_until": {"$lt": now}},
+            ]
+        },
+        {
+            "$set": {
+                "status": "sending",
+                "locked_until": now + timedelta(seconds=OUTBOX_LEASE_SECONDS),
+            }
+        },
+        sort=[("next_attempt_at", 1)],
+        return_document=ReturnDocument.AFTER,
+    )
+
+
+async def _mark_failed(document: dict, error: Exception) -> None:
+    attempts = document.get("attempts", 0) + 1
+    if attempts >= OUTBOX_MAX_ATTEMPTS:
+        update = {"status": "failed"}
+        metrics.incr("outbox.failed")
+    else:
+        delay = OUTBOX_BACKOFF_SECONDS * 2 ** (attempts - 1)
+        update = {
+            "status": "pending",
+            "next_attempt_at": datetime.utcnow() + timedelta(seconds=delay),
+        }
+        metrics.incr("outbox.retried")
+    update.update({"attempts": attempts, "last_error": str(error)})
+    await outbox.update_one({"_id": document["_id"]}, {"$set": update})
+    print(f"Échec de l'envoi de l'email à {document['to_email']} : {error}")
+
+
+async def drain_outbox(session: Optional[SMTPSession] = None) -> int:
+    """
+    Envoie au plus `OUTBOX_BATCH_SIZE` messages sur une même connexion SMTP.
+    Renvoie le nombre de messages traités.
+    """
+    if not SENDER_EMAIL:
+        print("ERREUR : La variable d'environnement SENDER_EMAIL n'est pas configurée.")
+        return 0
+
+    own_session = session is None
+    session = session or SMTPSession()
+    processed = 0
     try:
-        # Connexion au serveur SMTP de Gmail
-        print(f"Tentative d'envoi d'email à {to_email}...")
-        server = smtplib.SMTP("smtp.gmail.com", 587)
-        server.starttls()  # Sécurisation de la connexion
-        server.login(SENDER_EMAIL, GMAIL_APP_PASSWORD)
-
-        # Envoi de l'email
-        server.send_message(msg)
-
-        server.quit()
-        print(f"Email envoyé avec Succès ✅  à {to_email}.")
-    except Exception as e:
-        print(f"Échec de l'envoi de l'email : {e}")
+        while processed < OUTBOX_BATCH_SIZE:
+            document = await _claim_next()
+            if document is None:
+                break
+            processed += 1
+            try:
+                await asyncio.to_thread(session.send, _build_message(document))
+            except (smtplib.SMTPException, OSError) as e:
+                await asyncio.to_thread(session.close)
+                await _mark_failed(document, e)
+                continue
+            except Exception as e:
+                # Message invalide (adresse, contenu...) : compté comme un échec
+                # pour ne pas rester en `sending` et être repris indéfiniment
+                await _mark_failed(document, e)
+                continue
+            await outbox.update_one(
+                {"_id": document["_id"]},
+                {"$set": {"status": "sent", "sent_at": datetime.utcnow()}},
+            )
+            metrics.incr("outbox.sent")
+    finally:
+        if own_session:
+            await asyncio.to_thread(session.close)
+    return processed
+
+
+async def _run_worker() -> None:
+    session = SMTPSession()
+    while True:
+        # Remis à zéro avant de vider la boîte : un message ajouté pendant
+        # l'envoi réveillera le worker au lieu d'attendre le prochain sondage.
+        _wake_up.clear()
+        try:
+            processed = await drain_outbox(session)
+        except Exception as e:
+            print(f"Erreur du worker d'emails : {e}")
+            processed = 0
+        if processed >= OUTBOX_BATCH_SIZE:
+            continue  # La boîte n'est peut-être pas vide : on enchaîne
+        # Boîte vide : on libère la connexion SMTP et on attend
+        await asyncio.to_thread(session.close)
+        try:
+            await asyncio.wait_for(_wake_up.wait(), timeout=OUTBOX_POLL_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+
+
+def start_worker() -> None:
+    global _worker
+    if not SENDER_EMAIL:
+        print(
+            "ERREUR : SENDER_EMAIL n'est pas configurée, les emails ne seront pas envoyés."
+        )
+        return
+    if _worker is None:
+        _worker = asyncio.create_task(_run_worker())
+
+
+async def stop_worker() -> None:
+    global _worker
+    if _worker is not None:
+        _worker.cancel()
+        try:
+            await _worker
+        except asyncio.CancelledError:
+            pass
+        _worker = None
@@ -0,0 +1,44 @@
+"""
+Métriques internes du processus (compteurs et durées).
+
+Registre minimal, en mémoire et thread-safe (les listeners PyMongo sont
+appelés depuis les threads de Motor). Les valeurs sont exposées aux
+administrateurs par `GET /admin/metrics`.
+"""
+
+import threading
+from collections import defaultdict
+
+_lock = threading.Lock()
+_counters = defaultdict(int)
+_timings = {}
+
+
+def incr(name: str, value: int = 1) -> None:
+    """Incrémente le compteur `name`."""
+    with _lock:
+        _counters[name] += value
+
+
+def observe(name: str, seconds: float) -> None:
+    """Enregistre une durée (en secondes) pour la mesure `name`."""
+    with _lock:
+        timing = _timings.setdefault(name, {"count": 0, "total": 0.0, "max": 0.0})
+        timing["count"] += 1
+        timing["total"] += seconds
+        timing["max"] = max(timing["max"], seconds)
+
+
+def snapshot() -> dict:
+    """Copie des compteurs et des durées (moyenne et max en millisecondes)."""
+    with _lock:
+        counters = dict(_counters)
+        timings = {
+            name: {
+                "count": t["count"],
+                "avg_ms": round(t["total"] / t["count"] * 1000, 3),
+                "max_ms": round(t["max"] * 1000, 3),
+            }
+            for name, t in _timings.items()
+        }
+    return {"counters": counters, "timings": timings}
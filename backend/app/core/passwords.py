@@ -0,0 +1,106 @@
+"""
+Service de hachage des mots de passe (bcrypt).
+
+bcrypt coûte plusieurs dizaines de millisecondes de CPU par appel : exécuté
+directement dans un handler async, il bloque toute la boucle d'événements.
+Les appels sont donc déportés dans un `ProcessPoolExecutor` borné (tous les
+cœurs travaillent en parallèle, sans GIL partagé). Au-delà de
+`PASSWORD_MAX_PENDING` opérations en cours, les nouvelles demandes sont
+rejetées en 503 pour absorber les rafales de connexions.
+
+Ce module est importé par les processus du pool : il doit rester léger.
+"""
+
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+from dotenv import load_dotenv
+from fastapi import HTTPException, status
+from passlib.context import CryptContext
+
+from app.core import metrics
+
+load_dotenv()
+
+PASSWORD_WORKERS = int(os.getenv("PASSWORD_WORKERS", default=os.cpu_count() or 1))
+PASSWORD_MAX_PENDING = int(
+    os.getenv("PASSWORD_MAX_PENDING", default=PASSWORD_WORKERS * 8)
+)
+
+# Contexte de hachage unique pour toute l'application
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+_executor: Optional[ProcessPoolExecutor] = None
+_pending = 0
+
+
+def _hash(password: str) -> str:
+    return pwd_context.hash(password)
+
+
+def _verify(plain_password: str, hashed_password: str) -> bool:
+    return pwd_context.verify(plain_password, hashed_password)
+
+
+def _warm_up() -> None:
+    pass
+
+
+async def start() -> None:
+    """Démarre le pool (lifespan) et lance ses processus avant le trafic."""
+    global _executor
+    if _executor is None:
+        # "spawn" : les processus ne héritent pas des threads du client MongoDB
+        _executor = ProcessPoolExecutor(
+            max_workers=PASSWORD_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(
+            *(
+                loop.run_in_executor(_executor, _warm_up)
+                for _ in range(PASSWORD_WORKERS)
+            )
+        )
+
+
+def shutdown() -> None:
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+async def _run(func, *args):
+    global _pending
+    if _pending >= PASSWORD_MAX_PENDING:
+        metrics.incr("passwords.shed")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Service momentanément surchargé, veuillez réessayer.",
+            headers={"Retry-After": "1"},
+        )
+    if _executor is None:
+        # Scripts et contextes sans lifespan : pool créé à la demande
+        await start()
+
+    _pending += 1
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    try:
+        return await loop.run_in_executor(_executor, func, *args)
+    finally:
+        _pending -= 1
+        metrics.observe(f"passwords.{func.__name__.lstrip('_')}", loop.time() - started)
+
+
+async def hash_password(password: str) -> str:
+    return await _run(_hash, password)
+
+
+# Vérifie un mot de passe en clair par rapport au hash stocké
+async def verify_password(plain_password: str, hashed_password: str) -> bool:
+    return await _run(_verify, plain_password, hashed_password)
@@ -3,10 +3,10 @@ from typing import Union
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
-from passlib.context import CryptContext
 import os
 from dotenv import load_dotenv
 
+from app.core.user_cache import cache_user, get_cached_user
 from app.db.database import users
 from app.schemas.users import UserOut
 
@@ -16,22 +16,9 @@ SECRET_KEY = os.getenv("SECRET_KEY")
 ALGORITHM = os.getenv("ALGORITHM", default="HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", default=30))
 
-# Contexte de hachage pour les mots de passe
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
-
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
 
 
-def get_password_hash(password: str) -> str:
-    return pwd_context.hash(password)
-
-
-# Vérifie un mot de passe en clair par rapport au hash stocké
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
-
-
 # Crée un token d’accès signé
 def create_access_token(
     data: dict, expires_delta: Union[timedelta, None] = None
@@ -53,14 +40,23 @@ async def get_current_user(token: str = Depends(oauth2_scheme)) -> UserOut:
     )
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        user_email: str = payload.get("sub")
-        if user_email is None:
+        sub: str = payload.get("sub")
+        if sub is None:
             raise credentials_exception
     except JWTError:
         raise credentials_exception
-    user = await users.find_one({"email": user_email})
-    if user is None:
-        raise credentials_exception
-
-    user["id"] = str(user["_id"])
-    return UserOut(**user)
+    current_user = get_cached_user(sub)
+    if current_user is None:
+        user = await users.find_one({"email": sub})
+        if user is None:
+            raise credentials_exception
+        user["id"] = str(user["_id"])
+        current_user = UserOut(**user)
+        cache_user(sub, current_user)
+
+    # Une suspension prend effet immédiatement, même avec un token encore valide
+    if not current_user.is_active:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN, detail="Ce compte a été suspendu."
+        )
+    return current_user
@@ -0,0 +1,59 @@
+"""
+Cache en mémoire des utilisateurs authentifiés.
+
+`get_current_user` est appelé à chaque requête authentifiée : le `UserOut`
+correspondant au `sub` du token est gardé dans un cache LRU borné avec TTL.
+Toute écriture sur un utilisateur doit appeler `invalidate_user` (avec son
+id) pour que la modification (ex. suspension) prenne effet immédiatement.
+
+Le cache est propre à chaque processus : `invalidate_user` ne vide que celui
+du worker qui a fait l'écriture. Les autres continuent de servir l'ancien
+utilisateur (compte suspendu encore accepté, rôle modifié...) au plus
+`USER_CACHE_TTL` secondes ; le TTL est court pour borner ce délai.
+"""
+
+import os
+from typing import Optional
+
+from cachetools import TTLCache
+from dotenv import load_dotenv
+
+from app.core import metrics
+from app.schemas.users import UserOut
+
+load_dotenv()
+
+USER_CACHE_TTL = int(os.getenv("USER_CACHE_TTL", default=10))
+USER_CACHE_MAXSIZE = int(os.getenv("USER_CACHE_MAXSIZE", default=10000))
+
+# Clé : le `sub` exact du token (l'email tel qu'enregistré). Les emails sont
+# comparés en respectant la casse par MongoDB et l'index `email_unique` :
+# "Bob@x.com" et "bob@x.com" peuvent être deux comptes distincts.
+_users_by_sub = TTLCache(maxsize=USER_CACHE_MAXSIZE, ttl=USER_CACHE_TTL)
+# id utilisateur -> `sub` de son entrée, pour invalider par id
+_sub_by_user_id = TTLCache(maxsize=USER_CACHE_MAXSIZE, ttl=USER_CACHE_TTL)
+
+
+def get_cached_user(sub: str) -> Optional[UserOut]:
+    user = _users_by_sub.get(sub)
+    if user is None:
+        metrics.incr("user_cache.miss")
+        return None
+    metrics.incr("user_cache.hit")
+    # Même ordre LRU que l'entrée : la correspondance id -> `sub` ne doit pas
+    # être évincée avant elle, sinon `invalidate_user` ne la retrouverait pas
+    _sub_by_user_id.get(user.id)
+    return user
+
+
+def cache_user(sub: str, user: UserOut) -> None:
+    _users_by_sub[sub] = user
+    _sub_by_user_id[user.id] = sub
+
+
+def invalidate_user(*user_ids: Optional[str]) -> None:
+    """Retire un ou plusieurs utilisateurs du cache (par id)."""
+    for user_id in user_ids:
+        sub = _sub_by_user_id.pop(str(user_id), None) if user_id else None
+        if sub is not None and _users_by_sub.pop(sub, None) is not None:
+            metrics.incr("user_cache.invalidation")
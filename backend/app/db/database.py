@@ -1,20 +1,147 @@
-from motor.motor_asyncio import AsyncIOMotorClient
+import asyncio
 import os
+
 from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import monitoring
+
+from app.core import metrics
 
 load_dotenv()
 
 
 # MongoDB connection
 MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017")
-client = AsyncIOMotorClient(MONGO_URI)
+MONGO_DB_NAME = os.getenv("MONGO_DB_NAME", "arimin")
+
+# Réglages du pool de connexions (ajustables par déploiement)
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", default=100))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", default=5))
+MONGO_MAX_IDLE_TIME_MS = int(os.getenv("MONGO_MAX_IDLE_TIME_MS", default=300000))
+MONGO_WAIT_QUEUE_TIMEOUT_MS = int(
+    os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", default=5000)
+)
+# Ex. "zstd,snappy" (nécessite les paquets zstandard / python-snappy)
+MONGO_COMPRESSORS = os.getenv("MONGO_COMPRESSORS", default="")
+MONGO_READ_PREFERENCE = os.getenv("MONGO_READ_PREFERENCE", default="primary")
+
+
+class PoolMetricsListener(monitoring.ConnectionPoolListener):
+    """Publie les temps d'attente de checkout du pool dans `app.core.metrics`."""
+
+    def connection_checked_out(self, event):
+        metrics.incr("mongo.pool.checkouts")
+        if event.duration is not None:
+            metrics.observe("mongo.pool.checkout_wait", event.duration)
+
+    def connection_check_out_failed(self, event):
+        metrics.incr(f"mongo.pool.checkout_failed.{event.reason}")
+
+    def connection_created(self, event):
+        metrics.incr("mongo.pool.connections_created")
+
+    def connection_closed(self, event):
+        metrics.incr("mongo.pool.connections_closed")
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_checked_in(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        metrics.incr("mongo.pool.cleared")
+
+    def pool_closed(self, event):
+        pass
+
+
+_client = None
+
+
+def _create_client() -> AsyncIOMotorClient:
+    options = {
+        "maxPoolSize": MONGO_MAX_POOL_SIZE,
+        "minPoolSize": MONGO_MIN_POOL_SIZE,
+        "maxIdleTimeMS": MONGO_MAX_IDLE_TIME_MS,
+        "waitQueueTimeoutMS": MONGO_WAIT_QUEUE_TIMEOUT_MS,
+        "readPreference": MONGO_READ_PREFERENCE,
+        "event_listeners": [PoolMetricsListener()],
+    }
+    if MONGO_COMPRESSORS:
+        options["compressors"] = MONGO_COMPRESSORS
+    return AsyncIOMotorClient(MONGO_URI, **options)
+
+
+def get_client() -> AsyncIOMotorClient:
+    """
+    Client Motor du processus. Il est normalement créé par `connect()` dans le
+    lifespan de l'application ; les scripts en ligne de commande le créent à
+    la première utilisation.
+    """
+    global _client
+    if _client is None:
+        _client = _create_client()
+    return _client
+
+
+def get_database():
+    return get_client()[MONGO_DB_NAME]
+
+
+async def connect() -> None:
+    """
+    Crée le client et chauffe le pool avant d'accepter du trafic : un `ping`
+    vérifie que la base répond, puis `MONGO_MIN_POOL_SIZE` pings concurrents
+    ouvrent autant de connexions.
+    """
+    client = get_client()
+    await client.admin.command("ping")
+    await asyncio.gather(
+        *(client.admin.command("ping") for _ in range(MONGO_MIN_POOL_SIZE))
+    )
+    print(f"MongoDB prêt (pool min={MONGO_MIN_POOL_SIZE}, max={MONGO_MAX_POOL_SIZE})")
+
+
+def close() -> None:
+    global _client
+    if _client is not None:
+        _client.close()
+        _client = None
+
+
+class _LazyCollection:
+    """
+    Référence vers une collection, résolue à chaque accès sur le client
+    courant : les modules peuvent importer `users`, `shops`, ... au chargement
+    alors que le client n'est créé qu'au démarrage de l'application.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __getattr__(self, attr):
+        return getattr(get_database().get_collection(self.name), attr)
 
-database = client.arimin
 
 # Collections
-users = database.get_collection("users")
-shops = database.get_collection("shops")
-products = database.get_collection("products")
-reviews = database.get_collection("reviews")
-suggestions = database.get_collection("suggestions")
-orders = database.get_collection("orders")
+users = _LazyCollection("users")
+shops = _LazyCollection("shops")
+products = _LazyCollection("products")
+reviews = _LazyCollection("reviews")
+suggestions = _LazyCollection("suggestions")
+orders = _LazyCollection("orders")
+stats = _LazyCollection("stats")
+outbox = _LazyCollection("outbox")
+geocode_cache = _LazyCollection("geocode_cache")
+ai_jobs = _LazyCollection("ai_jobs")
+versions = _LazyCollection("versions")
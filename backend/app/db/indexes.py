@@ -0,0 +1,289 @@
+"""
+Registre déclaratif des index MongoDB.
+
+Chaque collection déclarée dans `app/db/database.py` liste ici les index dont
+ses requêtes « chaudes » ont besoin. `ensure_indexes` est appelé au démarrage
+de l'application (lifespan) et réconcilie l'état de la base de façon
+idempotente : les index manquants sont créés, ceux dont la définition a changé
+sont recréés, et les index en trop sont seulement signalés.
+
+Utilisation en ligne de commande (depuis le dossier `backend/`) :
+
+    python -m app.db.indexes              # rapport : index manquants / en trop
+    python -m app.db.indexes --apply      # crée / recrée les index déclarés
+    python -m app.db.indexes --apply --drop-extra
+"""
+
+import argparse
+import asyncio
+from typing import Dict, List
+
+from pymongo import ASCENDING, DESCENDING, GEOSPHERE, TEXT, IndexModel
+from pymongo.errors import PyMongoError
+
+from app.db import database
+
+# Options prises en compte pour décider si un index existant est conforme
+_COMPARED_OPTIONS = (
+    "unique",
+    "sparse",
+    "expireAfterSeconds",
+    "partialFilterExpression",
+    "default_language",
+)
+
+# Poids des champs pour la recherche plein texte (services/search.py).
+# MongoDB n'autorise qu'un seul index texte par collection.
+SHOP_TEXT_WEIGHTS = {"name": 10, "category": 5, "location": 3, "description": 1}
+PRODUCT_TEXT_WEIGHTS = {
+    "name": 10,
+    "shop.category": 5,
+    "shop.location": 3,
+    "description": 2,
+}
+
+
+def _text_index(weights: Dict[str, int], name: str) -> IndexModel:
+    return IndexModel(
+        [(field, TEXT) for field in weights],
+        name=name,
+        weights=weights,
+        default_language="french",
+    )
+
+
+INDEXES: Dict[str, List[IndexModel]] = {
+    "users": [
+        # get_current_user / login : un find_one par requête authentifiée
+        IndexModel([("email", ASCENDING)], name="email_unique", unique=True),
+        IndexModel(
+            [("role", ASCENDING), ("is_active", ASCENDING)], name="role_is_active"
+        ),
+    ],
+    "shops": [
+        IndexModel([("owner_id", ASCENDING)], name="owner_id"),
+        IndexModel(
+            [("is_published", ASCENDING), ("category", ASCENDING)],
+            name="is_published_category",
+        ),
+        # Pagination par curseur des boutiques publiques (utils/pagination.py)
+        IndexModel(
+            [("is_published", ASCENDING), ("_id", DESCENDING)],
+            name="is_published__id",
+        ),
+        # Requis par $geoNear dans routes/search.py
+        IndexModel([("geolocation", GEOSPHERE)], name="geolocation_2dsphere"),
+        _text_index(SHOP_TEXT_WEIGHTS, "shops_text"),
+    ],
+    "products": [
+        IndexModel([("shop_id", ASCENDING)], name="shop_id"),
+        # Lectures publiques sur le champ dénormalisé (services/products_services.py)
+        IndexModel(
+            [("is_visible", ASCENDING), ("shop_id", ASCENDING)],
+            name="is_visible_shop_id",
+        ),
+        IndexModel(
+            [("is_visible", ASCENDING), ("_id", DESCENDING)],
+            name="is_visible__id",
+        ),
+        _text_index(PRODUCT_TEXT_WEIGHTS, "products_text"),
+    ],
+    "orders": [
+        IndexModel(
+            [
+                ("user_id", ASCENDING),
+                ("is_archived", ASCENDING),
+                ("created_at", DESCENDING),
+                ("_id", DESCENDING),
+            ],
+            name="user_id_is_archived_created_at",
+        ),
+        # Index multiclé : dashboard marchand (sub_orders.shop_id)
+        IndexModel(
+            [("sub_orders.shop_id", ASCENDING), ("created_at", DESCENDING)],
+            name="sub_orders_shop_id_created_at",
+        ),
+        IndexModel(
+            [("created_at", DESCENDING), ("_id", DESCENDING)], name="created_at__id"
+        ),
+        IndexModel([("status", ASCENDING)], name="status"),
+    ],
+    "reviews": [
+        IndexModel(
+            [
+                ("shop_id", ASCENDING),
+                ("created_at", DESCENDING),
+                ("_id", DESCENDING),
+            ],
+            name="shop_id_created_at",
+        ),
+        IndexModel(
+            [("user_id", ASCENDING), ("created_at", DESCENDING)],
+            name="user_id_created_at",
+        ),
+    ],
+    "outbox": [
+        # Réservation du prochain message par le worker d'emails (core/email.py)
+        IndexModel(
+            [("status", ASCENDING), ("next_attempt_at", ASCENDING)],
+            name="status_next_attempt_at",
+        ),
+        # Les messages envoyés sont purgés après 7 jours
+        IndexModel(
+            [("sent_at", ASCENDING)], name="sent_at_ttl", expireAfterSeconds=604800
+        ),
+    ],
+    # Cache persistant du géocodage (services/geocoding.py), clé = requête
+    # normalisée dans `_id` ; les entrées sont rafraîchies après 90 jours
+    "geocode_cache": [
+        IndexModel(
+            [("updated_at", ASCENDING)],
+            name="updated_at_ttl",
+            expireAfterSeconds=7776000,
+        ),
+    ],
+    # Tâches de génération de descriptions (services/ai_jobs_services.py)
+    "ai_jobs": [
+        # Au plus une tâche en cours par boutique (start_description_job)
+        IndexModel(
+            [("shop_id", ASCENDING)],
+            name="shop_id_running_unique",
+            unique=True,
+            partialFilterExpression={"status": "running"},
+        ),
+        IndexModel(
+            [("status", ASCENDING), ("heartbeat_at", ASCENDING)],
+            name="status_heartbeat_at",
+        ),
+    ],
+    "suggestions": [
+        IndexModel(
+            [("created_at", DESCENDING), ("_id", DESCENDING)], name="created_at__id"
+        ),
+        IndexModel([("status", ASCENDING)], name="status"),
+    ],
+}
+
+
+def _spec(document: dict) -> dict:
+    """Forme normalisée d'un index (clés + options significatives)."""
+    # Pour un index texte, MongoDB remplace les champs par `_fts`/`_ftsx`
+    # et les range dans `weights` : on ramène les deux formes à la même.
+    weights = dict(document.get("weights") or {})
+    key = []
+    for field, direction in document["key"].items():
+        if field in ("_fts", "_ftsx"):
+            continue
+        if direction == TEXT:
+            weights.setdefault(field, 1)
+        else:
+            key.append((field, direction))
+
+    spec = {"key": key}
+    if weights:
+        spec["weights"] = {field: weights[field] for field in sorted(weights)}
+    for option in _COMPARED_OPTIONS:
+        if document.get(option) not in (None, False):
+            spec[option] = document[option]
+    return spec
+
+
+async def _existing_indexes(collection) -> Dict[str, dict]:
+    existing = {}
+    async for index in collection.list_indexes():
+        if index["name"] != "_id_":
+            existing[index["name"]] = _spec(index)
+    return existing
+
+
+async def diff_indexes() -> Dict[str, dict]:
+    """
+    Compare les index déclarés à ceux présents en base.
+    Renvoie, par collection, les noms des index manquants, modifiés et en trop.
+    """
+    report = {}
+    for collection_name, models in INDEXES.items():
+        collection = database.get_database().get_collection(collection_name)
+        existing = await _existing_indexes(collection)
+        declared = {model.document["name"]: _spec(model.document) for model in models}
+
+        report[collection_name] = {
+            "missing": [name for name in declared if name not in existing],
+            "changed": [
+                name
+                for name, spec in declared.items()
+                if name in existing and existing[name] != spec
+            ],
+            "extra": [name for name in existing if name not in declared],
+        }
+    return report
+
+
+async def ensure_indexes(drop_extra: bool = False) -> Dict[str, dict]:
+    """
+    Réconcilie les index de toutes les collections déclarées.
+    Une erreur sur une collection (ex. doublons empêchant un index unique)
+    est signalée sans bloquer le démarrage de l'application.
+    """
+    try:
+        report = await diff_indexes()
+    except PyMongoError as e:
+        print(f"Avertissement : impossible de lire les index existants : {e}")
+        return {}
+    for collection_name, models in INDEXES.items():
+        collection = database.get_database().get_collection(collection_name)
+        state = report[collection_name]
+        try:
+            for name in state["changed"]:
+                await collection.drop_index(name)
+            to_create = [
+                model
+                for model in models
+                if model.document["name"] in state["missing"] + state["changed"]
+            ]
+            if to_create:
+                await collection.create_indexes(to_create)
+                print(
+                    f"Index créés sur '{collection_name}' : "
+                    f"{[m.document['name'] for m in to_create]}"
+                )
+            if drop_extra:
+                for name in state["extra"]:
+                    await collection.drop_index(name)
+                    print(f"Index supprimé sur '{collection_name}' : {name}")
+        except PyMongoError as e:
+            print(f"Avertissement index '{collection_name}' : {e}")
+    return report
+
+
+def _print_report(report: Dict[str, dict]) -> bool:
+    clean = True
+    for collection_name, state in report.items():
+        for kind in ("missing", "changed", "extra"):
+            for name in state[kind]:
+                clean = False
+                print(f"{collection_name:<12} {kind:<8} {name}")
+    if clean:
+        print("Tous les index déclarés sont en place.")
+    return clean
+
+
+async def _main(apply: bool, drop_extra: bool) -> int:
+    if apply:
+        await ensure_indexes(drop_extra=drop_extra)
+    clean = _print_report(await diff_indexes())
+    return 0 if clean else 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Gestion des index MongoDB")
+    parser.add_argument(
+        "--apply", action="store_true", help="crée ou recrée les index déclarés"
+    )
+    parser.add_argument(
+        "--drop-extra",
+        action="store_true",
+        help="avec --apply, supprime les index non déclarés",
+    )
+    args = parser.parse_args()
+    raise SystemExit(asyncio.run(_main(args.apply, args.drop_extra)))
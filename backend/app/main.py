@@ -1,3 +1,4 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.routes import (
@@ -15,11 +16,40 @@ from app.routes import (
 )
 from fastapi.openapi.utils import get_openapi
 from fastapi.security import OAuth2PasswordBearer
-
+from app.core import cache, email, passwords
+from app.db import database
+from app.db.indexes import ensure_indexes
+from app.services import ai_jobs_services, geocoding
+from app.services.products_services import sync_unsynced_products
+from app.services.stats_services import ensure_counters
+from app.utils.pagination import LIMIT_HEADER, NEXT_CURSOR_HEADER
+from app.utils.responses import MongoJSONResponse
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Client MongoDB créé ici et pool chauffé avant d'accepter du trafic
+    await database.connect()
+    await passwords.start()
+    # Réconciliation idempotente des index
+    await ensure_indexes()
+    await sync_unsynced_products()
+    await ensure_counters()
+    email.start_worker()
+    await ai_jobs_services.resume_description_jobs()
+    yield
+    await ai_jobs_services.stop_description_jobs()
+    await email.stop_worker()
+    await geocoding.close()
+    await cache.close()
+    passwords.shutdown()
+    database.close()
+
+
+# orjson + ObjectId/datetime natifs pour toutes les réponses (app/utils/responses.py)
+app = FastAPI(lifespan=lifespan, default_response_class=MongoJSONResponse)
 
 app.include_router(users.router, tags=["Users"])
 app.include_router(auth.router, tags=["Auth"])
@@ -44,6 +74,9 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # En-têtes de pagination par curseur (app/utils/pagination.py) et ETag
+    # des lectures publiques (app/utils/http_cache.py)
+    expose_headers=[NEXT_CURSOR_HEADER, LIMIT_HEADER, "ETag"],
 )
 
 
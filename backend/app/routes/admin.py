@@ -1,29 +1,55 @@
 from bson import ObjectId
-from fastapi import APIRouter, Body, Depends, HTTPException, Query
-from typing import List, Optional
+from fastapi import APIRouter, Body, Depends, HTTPException, Query, Response
+from datetime import datetime
+from fastapi.responses import StreamingResponse
+from pymongo import ReturnDocument
+from typing import List, Literal, Optional, Union
 
 from app.db.database import users, shops, suggestions, orders, products
 from app.schemas.users import UserOut
+from app.core import metrics
 from app.core.dependencies import get_current_admin
-from app.models import shop, product
+from app.core.user_cache import invalidate_user
 from app.schemas.shop import ShopOut, ShopWithOwner
 from app.schemas.suggestions import SuggestionCreate, SuggestionOut, SuggestionReply
 from app.schemas.order import OrderOut
-from app.schemas.product import ProductWithShopInfo
+from app.schemas.product import PRODUCT_FIELDSETS, ProductCard, ProductWithShopInfo
+from app.services import orders_services, versions_services
+from app.services.products_services import sync_owner_products, sync_shop_products
+from app.services.stats_services import (
+    get_order_counts,
+    get_platform_counts,
+    get_suggestion_counts,
+    track_status_change,
+)
+from app.utils.export import build_export_filter, stream_csv, stream_ndjson
+from app.utils.fieldsets import Fieldset, fields_param
+from app.utils.responses import model_response
+from app.utils.pagination import (
+    PageParams,
+    finalize_page,
+    find_page,
+    keyset_stages,
+    limit_stage,
+    page_params,
+)
 
 router = APIRouter()
 
 
 @router.get("/users", response_model=List[UserOut])
 async def get_all_users(
+    response: Response,
     admin_user: UserOut = Depends(get_current_admin),
     role: Optional[str] = Query(None, enum=["client", "merchant"]),
     # --- AJOUT : Nouveaux paramètres de filtre ---
     status: Optional[str] = Query(None, enum=["active", "suspended"]),
     search: Optional[str] = Query(None, min_length=2),
+    page: PageParams = Depends(page_params(default=100, maximum=500)),
 ):
     """
     Route pour voir tous les utilisateurs, avec filtres par rôle, statut et recherche.
+    Les résultats sont paginés par curseur (en-tête `X-Next-Cursor`).
     """
     query_filter = {}
     if role:
@@ -40,8 +66,9 @@ async def get_all_users(
             {"email": {"$regex": search, "$options": "i"}},
         ]
 
-    all_users = await users.find(query_filter).to_list(length=None)
-    return [UserOut(**user) for user in all_users]
+    all_users = await find_page(users, query_filter, page).to_list(length=None)
+    all_users = finalize_page(all_users, page, response)
+    return model_response(List[UserOut], all_users, response)
 
 
 @router.patch("/users/{user_id}/status", response_model=dict)
@@ -65,6 +92,9 @@ async def update_user_status(
     await users.update_one(
         {"_id": ObjectId(user_id)}, {"$set": {"is_active": is_active}}
     )
+    invalidate_user(user_id)
+    if target_user.get("role") == "merchant":
+        await sync_owner_products(ObjectId(user_id))
     action = "réactivé" if is_active else "suspendu"
     return {"message": f"L'utilisateur a été {action} avec Succès ✅ ."}
 
@@ -97,24 +127,39 @@ async def delete_user(user_id: str, admin_user: UserOut = Depends(get_current_ad
         )
 
         # 1. Trouver toutes les boutiques de ce marchand
-        shops_to_delete_cursor = shop.find({"owner_id": user_id_obj}, {"_id": 1})
+        shops_to_delete_cursor = shops.find({"owner_id": user_id_obj}, {"_id": 1})
         shop_ids_to_delete = [
             s["_id"] for s in await shops_to_delete_cursor.to_list(length=None)
         ]
 
         if shop_ids_to_delete:
+            deleted_products = await products.find(
+                {"shop_id": {"$in": shop_ids_to_delete}}, {"shop_id": 1}
+            ).to_list(length=None)
+
             # 2. Supprimer tous les produits de ces boutiques
-            product_delete_result = await product.delete_many(
+            product_delete_result = await products.delete_many(
                 {"shop_id": {"$in": shop_ids_to_delete}}
             )
             print(f"  -> {product_delete_result.deleted_count} produits supprimés.")
 
             # 3. Supprimer toutes les boutiques elles-mêmes
-            shop_delete_result = await shop.delete_many(
+            shop_delete_result = await shops.delete_many(
                 {"_id": {"$in": shop_ids_to_delete}}
             )
             print(f"  -> {shop_delete_result.deleted_count} boutiques supprimées.")
+
+            for shop_id in shop_ids_to_delete:
+                await versions_services.bump_shop_catalog(
+                    shop_id,
+                    [
+                        product["_id"]
+                        for product in deleted_products
+                        if product["shop_id"] == shop_id
+                    ],
+                )
     await users.delete_one({"_id": ObjectId(user_id)})
+    invalidate_user(user_id)
     return {"message": "Utilisateur supprimé avec Succès ✅ ."}
 
 
@@ -140,23 +185,28 @@ async def get_shops_by_owner(
     if not ObjectId.is_valid(user_id):
         raise HTTPException(status_code=400, detail="ID utilisateur invalide")
 
-    shops_cursor = shops.find({"owner_id": ObjectId(user_id)})
-    return [ShopOut(**shop) async for shop in shops_cursor]
+    owner_shops = await shops.find({"owner_id": ObjectId(user_id)}).to_list(length=None)
+    return model_response(List[ShopOut], owner_shops)
 
 
 # --- NOUVELLE ROUTE : Obtenir les suggestions ---
 
 
 @router.get("/suggestions", response_model=List[SuggestionOut])
-async def get_all_suggestions(admin_user: UserOut = Depends(get_current_admin)):
+async def get_all_suggestions(
+    response: Response,
+    admin_user: UserOut = Depends(get_current_admin),
+    page: PageParams = Depends(page_params(default=100, maximum=500)),
+):
     """
-    Route admin pour lister toutes les suggestions reçues.
+    Route admin pour lister les suggestions reçues, paginées par curseur.
     URL finale : /admin/suggestions
     """
-    all_suggestions = (
-        await suggestions.find().sort("created_at", -1).to_list(length=None)
+    cursor = find_page(suggestions, {}, page, "created_at")
+    all_suggestions = finalize_page(
+        await cursor.to_list(length=None), page, response, "created_at"
     )
-    return [SuggestionOut(**s) for s in all_suggestions]
+    return model_response(List[SuggestionOut], all_suggestions, response)
 
 
 @router.get("/suggestions/stats", response_model=dict)
@@ -165,13 +215,11 @@ async def get_suggestion_stats(admin_user: UserOut = Depends(get_current_admin))
     Renvoie les statistiques sur les suggestions.
     URL finale : /admin/suggestions/stats
     """
-    total_count = await suggestions.count_documents({})
-    new_count = await suggestions.count_documents({"status": "nouveau"})
-    return {"total": total_count, "new": new_count}
+    return await get_suggestion_counts()
 
 
 # Assurez-vous d'avoir ces imports en haut de votre fichier admin.py
-from app.core.email import send_email
+from app.core.email import enqueue_email
 from app.db.database import suggestions
 from app.schemas.suggestions import SuggestionOut, SuggestionReply
 
@@ -195,7 +243,7 @@ async def reply_to_suggestion(
     if not original_suggestion:
         raise HTTPException(status_code=404, detail="Suggestion non trouvée")
 
-    # --- 2. On prépare et on envoie l'email de réponse ---
+    # --- 2. On prépare l'email de réponse et on le place dans la boîte d'envoi ---
     subject = f"Réponse à votre message sur Ahimin"
     html_content = f"""
     <p>Bonjour {original_suggestion.get('name', 'Utilisateur')},</p>
@@ -205,7 +253,7 @@ async def reply_to_suggestion(
     </p>
     <p>Cordialement,<br>L'équipe Ahimin</p>
     """
-    await send_email(
+    await enqueue_email(
         to_email=original_suggestion["email"],
         subject=subject,
         html_content=html_content,
@@ -213,29 +261,39 @@ async def reply_to_suggestion(
     # --------------------------------------------------
 
     # 3. On met à jour le statut de la suggestion dans la base de données
-    updated_suggestion = await suggestions.find_one_and_update(
+    reply = {"status": "répondu", "admin_reply": reply_data.reply_message}
+    # Document AVANT la mise à jour : le statut remplacé est lu atomiquement,
+    # deux réponses simultanées ne décomptent donc la suggestion qu'une fois
+    previous_suggestion = await suggestions.find_one_and_update(
         {"_id": ObjectId(suggestion_id)},
-        {"$set": {"status": "répondu", "admin_reply": reply_data.reply_message}},
-        return_document=True,  # Important pour récupérer le document mis à jour
+        {"$set": reply},
+        return_document=ReturnDocument.BEFORE,
     )
 
-    if not updated_suggestion:
+    if not previous_suggestion:
         # Cette erreur ne devrait normalement pas se produire si la première recherche a fonctionné
         raise HTTPException(
             status_code=404, detail="Suggestion non trouvée après la mise à jour."
         )
+    await track_status_change(
+        "suggestions_new", "nouveau", previous_suggestion.get("status"), "répondu"
+    )
 
-    return SuggestionOut(**updated_suggestion)
+    return SuggestionOut(**{**previous_suggestion, **reply})
 
 
 # --- NOUVELLE ROUTE : Lister toutes les commandes ---
 
 
 @router.get("/orders", response_model=List[OrderOut])
-async def get_all_orders(admin_user: UserOut = Depends(get_current_admin)):
+async def get_all_orders(
+    response: Response,
+    admin_user: UserOut = Depends(get_current_admin),
+    page: PageParams = Depends(page_params(default=100, maximum=500)),
+):
     pipeline = [
-        {"$sort": {"created_at": -1}},
-        {"$limit": 100},
+        *keyset_stages(page, "created_at"),
+        limit_stage(page),
         {
             "$lookup": {
                 "from": "users",
@@ -244,18 +302,12 @@ async def get_all_orders(admin_user: UserOut = Depends(get_current_admin)):
                 "as": "customer",
             }
         },
-        {"$unwind": "$customer"},
+        # On garde les commandes dont le client a été supprimé
+        {"$unwind": {"path": "$customer", "preserveNullAndEmptyArrays": True}},
     ]
     all_orders_from_db = await orders.aggregate(pipeline).to_list(length=None)
-
-    for order in all_orders_from_db:
-        order["_id"] = str(order["_id"])
-        order["user_id"] = str(order["user_id"])
-        order["customer"]["_id"] = str(order["customer"]["_id"])
-        for sub in order.get("sub_orders", []):
-            sub["shop_id"] = str(sub["shop_id"])
-
-    return [OrderOut.model_validate(o) for o in all_orders_from_db]
+    all_orders_from_db = finalize_page(all_orders_from_db, page, response, "created_at")
+    return model_response(List[OrderOut], all_orders_from_db, response)
 
 
 # --- NOUVELLE ROUTE : Obtenir les statistiques des commandes ---
@@ -264,10 +316,7 @@ async def get_order_stats(admin_user: UserOut = Depends(get_current_admin)):
     """
     Renvoie les statistiques sur les commandes.
     """
-    total_count = await orders.count_documents({})
-    pending_count = await orders.count_documents({"status": "En attente"})
-
-    return {"total": total_count, "pending": pending_count}
+    return await get_order_counts()
 
 
 @router.patch("/orders/{order_id}/sub_orders/{shop_id}/status", response_model=OrderOut)
@@ -278,102 +327,59 @@ async def update_sub_order_status(
     current_user: UserOut = Depends(get_current_admin),
 ):
     """
-    Met à jour le statut d'une sous-commande et recalcule le statut global de la commande.
+    Met à jour le statut d'une sous-commande et recalcule le statut global de la commande
+    (voir `app/services/orders_services.py`).
     """
-    if not ObjectId.is_valid(order_id):
+    if not ObjectId.is_valid(order_id) or not ObjectId.is_valid(shop_id):
         raise HTTPException(status_code=400, detail="ID de commande invalide.")
 
-    # --- CORRECTION : On cherche le shop_id en tant que string ---
-    query = {"_id": ObjectId(order_id), "sub_orders.shop_id": ObjectId(shop_id)}
-    update = {"$set": {"sub_orders.$.status": status}}
-    # 1. Mise à jour de la sous-commande
-    updated_doc = await orders.find_one_and_update(query, update)
-    if not updated_doc:
-        raise HTTPException(
-            status_code=404,
-            detail="Commande non trouvée ou non autorisée pour cette boutique.",
-        )
-
-    # 2. On récupère la commande complète pour recalculer le statut global
-    updated_order_doc = await orders.find_one({"_id": ObjectId(order_id)})
-
-    # 3. Logique de mise à jour du statut global
-    sub_statuses = [so["status"] for so in updated_order_doc.get("sub_orders", [])]
-    new_global_status = updated_order_doc["status"]
-    if all(s == "Livrée" for s in sub_statuses):
-        new_global_status = "Livrée"
-    elif any(s == "En cours de livraison" for s in sub_statuses):
-        new_global_status = "En cours de livraison"
-    elif all(s == "Annulée" for s in sub_statuses):
-        new_global_status = "Annulée"
-
-    # 4. On met à jour le statut global dans la BDD
-    if new_global_status != updated_order_doc["status"]:
-        await orders.update_one(
-            {"_id": ObjectId(order_id)}, {"$set": {"status": new_global_status}}
-        )
-        updated_order_doc["status"] = new_global_status
-
-    # 5. On enrichit et on renvoie la commande finale
-    customer = await users.find_one({"_id": updated_order_doc["user_id"]})
-    if customer:
-        updated_order_doc["customer"] = customer
-
-    # Conversion manuelle
-    updated_order_doc["_id"] = str(updated_order_doc["_id"])
-    updated_order_doc["user_id"] = str(updated_order_doc["user_id"])
-    if updated_order_doc.get("customer"):
-        updated_order_doc["customer"]["_id"] = str(updated_order_doc["customer"]["_id"])
-    for sub in updated_order_doc.get("sub_orders", []):
-        sub["shop_id"] = str(sub["shop_id"])
-
-    return OrderOut.model_validate(updated_order_doc)
+    updated_order_doc = await orders_services.update_sub_order_status(
+        ObjectId(order_id), ObjectId(shop_id), status
+    )
+    updated_order_doc = await orders_services.with_customer(updated_order_doc)
+    return model_response(OrderOut, updated_order_doc)
 
 
 # --- NOUVELLE ROUTE : Obtenir toutes les statistiques en un seul appel ---
 @router.get("/stats", response_model=dict)
 async def get_platform_stats(admin_user: UserOut = Depends(get_current_admin)):
-    user_count = await users.count_documents({})
-    shop_count = await shops.count_documents({})
-    product_count = await products.count_documents({})
-    order_count = await orders.count_documents({})
-    suggestion_count = await suggestions.count_documents({"status": "nouveau"})
-    return {
-        "users": user_count,
-        "shops": shop_count,
-        "products": product_count,
-        "orders": order_count,
-        "suggestions": suggestion_count,
-    }
+    return await get_platform_counts()
 
 
 # --- NOUVELLE ROUTE : Lister toutes les boutiques ---
 @router.get("/shops", response_model=List[ShopWithOwner])
 async def get_all_shops(
+    response: Response,
     admin_user: UserOut = Depends(get_current_admin),
-    search: Optional[str] = Query(None) # On ajoute le paramètre de recherche
+    search: Optional[str] = Query(None),  # On ajoute le paramètre de recherche
+    page: PageParams = Depends(page_params(default=100, maximum=500)),
 ):
     pipeline = []
     # On ajoute le filtre de recherche s'il est présent
     if search:
         pipeline.append({"$match": {"name": {"$regex": search, "$options": "i"}}})
-    
-    pipeline.extend([
-        {"$lookup": {"from": "users", "localField": "owner_id", "foreignField": "_id", "as": "owner_details"}},
-        {"$unwind": {"path": "$owner_details", "preserveNullAndEmptyArrays": True}}
-    ])
+
+    pipeline.extend(
+        [
+            *keyset_stages(page),
+            limit_stage(page),
+            {
+                "$lookup": {
+                    "from": "users",
+                    "localField": "owner_id",
+                    "foreignField": "_id",
+                    "as": "owner_details",
+                }
+            },
+            {"$unwind": {"path": "$owner_details", "preserveNullAndEmptyArrays": True}},
+        ]
+    )
 
     all_shops = await shops.aggregate(pipeline).to_list(length=None)
+    all_shops = finalize_page(all_shops, page, response)
 
-    # Conversion manuelle des IDs
     for shop in all_shops:
-        shop["_id"] = str(shop["_id"])
-        if shop.get("owner_id"):
-            shop["owner_id"] = str(shop["owner_id"])
-
-        if shop.get("owner_details"):
-            shop["owner_details"]["_id"] = str(shop["owner_details"]["_id"])
-        else:
+        if not shop.get("owner_details"):
             # --- CORRECTION ICI ---
             # On fournit un email valide fictif
             shop["owner_details"] = {
@@ -384,41 +390,29 @@ async def get_all_shops(
                 "is_active": False,
             }
 
-    return [ShopWithOwner.model_validate(s) for s in all_shops]
+    return model_response(List[ShopWithOwner], all_shops, response)
 
 
 # --- NOUVELLE ROUTE : Lister tous les produits ---
-@router.get("/products", response_model=List[ProductWithShopInfo])
+@router.get("/products", response_model=List[Union[ProductCard, ProductWithShopInfo]])
 async def get_all_products(
+    response: Response,
     admin_user: UserOut = Depends(get_current_admin),
-    search: Optional[str] = Query(None) # On ajoute le paramètre de recherche
+    search: Optional[str] = Query(None),  # On ajoute le paramètre de recherche
+    page: PageParams = Depends(page_params(default=100, maximum=500)),
+    fieldset: Fieldset = Depends(fields_param(PRODUCT_FIELDSETS)),
 ):
-    pipeline = []
+    query_filter = {}
     # On ajoute le filtre de recherche s'il est présent
     if search:
-        pipeline.append({"$match": {"name": {"$regex": search, "$options": "i"}}})
+        query_filter["name"] = {"$regex": search, "$options": "i"}
 
-    pipeline.extend([
-        {"$lookup": {"from": "shops", "localField": "shop_id", "foreignField": "_id", "as": "shop_details"}},
-        {"$unwind": "$shop_details"},
-        {
-            "$project": {
-                "_id": 1,
-                "name": 1,
-                "price": 1,
-                "images": 1,
-                "shop_id": 1,
-                "shop": {"_id": "$shop_details._id", "name": "$shop_details.name"},
-            }
-        },
-    ])
-    product_list = await products.aggregate(pipeline).to_list(length=None)
-    for p in product_list:
-        p["_id"] = str(p["_id"])
-        p["shop_id"] = str(p["shop_id"])
-        if p.get("shop"):
-            p["shop"]["_id"] = str(p["shop"]["_id"])
-    return [ProductWithShopInfo.model_validate(p) for p in product_list]
+    # L'instantané `shop` est dénormalisé sur chaque produit : pas de jointure
+    product_list = await find_page(
+        products, query_filter, page, projection=fieldset.projection
+    ).to_list(length=None)
+    product_list = finalize_page(product_list, page, response)
+    return model_response(List[fieldset.model], product_list, response)
 
 
 # --- NOUVELLE ROUTE : Supprimer n'importe quelle boutique ---
@@ -430,11 +424,13 @@ async def admin_delete_shop(
         raise HTTPException(status_code=400, detail="ID invalide")
 
     # Suppression en cascade des produits puis de la boutique
+    product_ids = await products.distinct("_id", {"shop_id": ObjectId(shop_id)})
     await products.delete_many({"shop_id": ObjectId(shop_id)})
     result = await shops.delete_one({"_id": ObjectId(shop_id)})
 
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Boutique non trouvée")
+    await versions_services.bump_shop_catalog(ObjectId(shop_id), product_ids)
     return {"message": "Boutique et produits associés supprimés"}
 
 
@@ -446,10 +442,13 @@ async def admin_delete_product(
     if not ObjectId.is_valid(product_id):
         raise HTTPException(status_code=400, detail="ID de produit invalide")
 
-    result = await products.delete_one({"_id": ObjectId(product_id)})
+    deleted = await products.find_one_and_delete(
+        {"_id": ObjectId(product_id)}, projection={"shop_id": 1}
+    )
 
-    if result.deleted_count == 0:
+    if deleted is None:
         raise HTTPException(status_code=404, detail="Produit non trouvé")
+    await versions_services.bump_product(deleted["shop_id"], deleted["_id"])
 
     return {"message": "Produit supprimé avec succès."}
 
@@ -469,6 +468,7 @@ async def admin_publish_shop(
     )
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Boutique non trouvée")
+    await sync_shop_products(ObjectId(shop_id))
 
     return {"message": "Boutique publiée par l'administrateur."}
 
@@ -485,5 +485,45 @@ async def admin_unpublish_shop(
     )
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Boutique non trouvée")
+    await sync_shop_products(ObjectId(shop_id))
 
     return {"message": "Boutique dépubliée par l'administrateur."}
+
+
+# --- NOUVELLE ROUTE : Export en flux (NDJSON / CSV) d'une collection ---
+@router.get("/export/{collection}")
+async def export_collection(
+    collection: Literal["users", "shops", "products", "orders"],
+    format: Literal["ndjson", "csv"] = Query("ndjson"),
+    role: Optional[str] = Query(None, enum=["client", "merchant", "admin"]),
+    status: Optional[str] = Query(None),
+    date_from: Optional[datetime] = Query(None),
+    date_to: Optional[datetime] = Query(None),
+    admin_user: UserOut = Depends(get_current_admin),
+):
+    """
+    Exporte une collection complète en flux, sans la charger en mémoire.
+    URL finale : /admin/export/{collection}?format=csv
+    """
+    query = build_export_filter(collection, role, status, date_from, date_to)
+    if format == "csv":
+        content, media_type = stream_csv(collection, query), "text/csv"
+    else:
+        content, media_type = stream_ndjson(collection, query), "application/x-ndjson"
+
+    filename = f"{collection}-{datetime.utcnow():%Y%m%d-%H%M%S}.{format}"
+    return StreamingResponse(
+        content,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+# --- NOUVELLE ROUTE : Métriques internes du processus ---
+@router.get("/metrics", response_model=dict)
+async def get_metrics(admin_user: UserOut = Depends(get_current_admin)):
+    """
+    Compteurs et durées internes (pool MongoDB, caches, ...).
+    URL finale : /admin/metrics
+    """
+    return metrics.snapshot()
@@ -1,49 +1,108 @@
-import os
-from fastapi import APIRouter, HTTPException
-import google.generativeai as genai
+import json
+from contextlib import aclosing
 
-from app.schemas.ai import GenerationRequest
+from bson import ObjectId
+from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import StreamingResponse
+
+from app.core.dependencies import get_current_merchant
+from app.db.database import shops
+from app.schemas.ai import DescriptionJobOut, GenerationRequest
+from app.schemas.users import UserOut
+from app.services import ai_jobs_services, ai_services
 
-# Configuration du client Google AI avec votre clé
-genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
-model = genai.GenerativeModel("gemini-pro")
 router = APIRouter()
 
 
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
 @router.post("/generate-description", response_model=dict)
 async def generate_description(request: GenerationRequest):
     if not request.name:
         raise HTTPException(status_code=400, detail="Le nom ne peut pas être vide.")
 
     try:
-        model = genai.GenerativeModel("gemini-1.5-flash")
+        description = await ai_services.generate_description(request)
+        return {"description": description}
     except Exception as e:
+        print(f"Erreur API Google: {e}")
         raise HTTPException(
-            status_code=500, detail=f"Impossible d'initialiser le modèle d'IA: {e}"
+            status_code=500, detail="Le service de génération de texte a échoué."
         )
 
-    # --- NOUVELLE LOGIQUE DE PROMPT ---
 
-    # On construit la base du contexte
-    base_prompt = f"Pour un(e) {request.target_type} nommé(e) '{request.name}'"
-    if request.category and request.category != "Tous":
-        base_prompt += f" dans la catégorie '{request.category}'"
-    if request.location and request.location != "Toutes les villes":
-        base_prompt += f" situé(e) à {request.location}"
+@router.post("/generate-description/stream")
+async def stream_description(request: GenerationRequest):
+    """
+    Variante en Server-Sent Events : un évènement `chunk` par morceau de texte
+    généré, puis `done` avec la description complète (ou `error`). Si le
+    client se déconnecte, la génération en cours est annulée.
+    """
+    if not request.name:
+        raise HTTPException(status_code=400, detail="Le nom ne peut pas être vide.")
 
-    # On adapte l'instruction finale
-    if request.description and len(request.description.strip()) > 10:
-        # Si une description existe déjà, on demande à l'IA de l'améliorer
-        prompt = f"{base_prompt}, améliore et reformule le texte suivant pour en faire une description commerciale plus attrayante (2-3 phrases) : '{request.description}'. Adopte un ton accueillant et local."
-    else:
-        # Sinon, on lui demande de créer une description de zéro
-        prompt = f"{base_prompt}, rédige une description commerciale courte (2-3 phrases). Met en avant un bénéfice client clair et adopte un ton accueillant et local."
+    prompt = ai_services.build_prompt(request)
 
-    try:
-        response = await model.generate_content_async(prompt)
-        return {"description": response.text}
-    except Exception as e:
-        print(f"Erreur API Google: {e}")
+    async def events():
+        chunks = []
+        try:
+            async with aclosing(ai_services.stream_text(prompt)) as stream:
+                async for chunk in stream:
+                    chunks.append(chunk)
+                    yield _sse("chunk", {"text": chunk})
+        except Exception as e:
+            print(f"Erreur API Google: {e}")
+            yield _sse(
+                "error", {"detail": "Le service de génération de texte a échoué."}
+            )
+            return
+        yield _sse("done", {"description": "".join(chunks)})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        # Pas de mise en tampon par les proxys : chaque évènement part aussitôt
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.post(
+    "/shops/{shop_id}/generate-descriptions",
+    response_model=DescriptionJobOut,
+    status_code=status.HTTP_202_ACCEPTED,
+)
+async def generate_shop_descriptions(
+    shop_id: str, current_user: UserOut = Depends(get_current_merchant)
+):
+    """
+    Lance en arrière-plan la génération des descriptions manquantes pour tous
+    les produits de la boutique. Suivre la progression via `GET /ai/jobs/{id}`.
+    """
+    if not ObjectId.is_valid(shop_id):
+        raise HTTPException(status_code=400, detail="ID de boutique invalide")
+
+    shop = await shops.find_one(
+        {"_id": ObjectId(shop_id), "owner_id": ObjectId(current_user.id)}
+    )
+    if not shop:
         raise HTTPException(
-            status_code=500, detail="Le service de génération de texte a échoué."
+            status_code=403, detail="Action non autorisée sur cette boutique."
         )
+
+    job = await ai_jobs_services.start_description_job(shop, ObjectId(current_user.id))
+    return DescriptionJobOut.model_validate(job)
+
+
+@router.get("/jobs/{job_id}", response_model=DescriptionJobOut)
+async def get_description_job(
+    job_id: str, current_user: UserOut = Depends(get_current_merchant)
+):
+    if not ObjectId.is_valid(job_id):
+        raise HTTPException(status_code=400, detail="ID de tâche invalide")
+
+    job = await ai_jobs_services.get_description_job(ObjectId(job_id))
+    if not job or job["owner_id"] != ObjectId(current_user.id):
+        raise HTTPException(status_code=404, detail="Tâche non trouvée")
+    return DescriptionJobOut.model_validate(job)
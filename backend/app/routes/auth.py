@@ -1,7 +1,8 @@
 from fastapi import APIRouter, HTTPException, Depends, status
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from app.db.database import users
-from app.core.security import verify_password, create_access_token
+from app.core.passwords import verify_password
+from app.core.security import create_access_token
 from app.schemas.token import Token
 from bson import ObjectId
 
@@ -25,7 +26,7 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends()):
     if not user.get("is_active", True):
         raise HTTPException(status_code=403, detail="Ce compte a été suspendu.")
 
-    if not verify_password(form_data.password, user["password"]):
+    if not await verify_password(form_data.password, user["password"]):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Email ou mot de passe incorrect",
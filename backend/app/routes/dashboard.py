@@ -2,89 +2,140 @@ from fastapi import APIRouter, Depends, HTTPException, Body, Query
 from typing import List, Optional
 from bson import ObjectId
 
-from app.db.database import orders, shops, users
+from app.db.database import orders, shops
 from app.schemas.order import OrderOut
 from app.schemas.users import UserOut
 from app.schemas.dashboard import ShopWithOrders
 from app.core.dependencies import get_current_merchant
+from app.services import orders_services
+from app.utils.pagination import PageParams, encode_cursor, keyset_stages, page_params
+from app.utils.responses import model_response
 
 router = APIRouter()
 
 
+# Champs du client joints aux commandes (ceux de `UserOut`)
+CUSTOMER_PROJECTION = {
+    "first_name": 1,
+    "email": 1,
+    "phone": 1,
+    "location": 1,
+    "whatsapp_call_link": 1,
+    "is_active": 1,
+    "role": 1,
+}
+
+
 @router.get("/orders", response_model=List[ShopWithOrders])
 async def get_merchant_orders_grouped(
     current_user: UserOut = Depends(get_current_merchant),
     status_filter: Optional[str] = Query(None),  # Le paramètre s'appelle 'status'
+    shop_id: Optional[str] = Query(None, description="Limiter à une boutique"),
+    page: PageParams = Depends(page_params(default=20, maximum=100)),
 ):
     """
     Récupère les commandes du marchand, groupées par boutique, avec filtre de statut.
+
+    Chaque boutique reçoit au plus `limit` commandes (les plus récentes), le
+    nombre total de ses sous-commandes correspondantes (`total`) et, s'il en
+    reste, un `next_cursor` : la page suivante d'une boutique se demande avec
+    `shop_id` et `cursor`. Chaque commande ne contient que la sous-commande
+    de la boutique concernée.
     """
     # 1. Récupérer les boutiques du marchand
-    merchant_shops_cursor = shops.find({"owner_id": ObjectId(current_user.id)})
-    merchant_shops = await merchant_shops_cursor.to_list(length=None)
+    shop_query = {"owner_id": ObjectId(current_user.id)}
+    if shop_id:
+        if not ObjectId.is_valid(shop_id):
+            raise HTTPException(status_code=400, detail="ID de boutique invalide")
+        shop_query["_id"] = ObjectId(shop_id)
+    merchant_shops = await shops.find(shop_query, {"name": 1}).to_list(length=None)
     if not merchant_shops:
         return []
 
     merchant_shop_ids = [s["_id"] for s in merchant_shops]
 
-    # 2. On construit le filtre de base
-    match_filter = {
-        "sub_orders.shop_id": {"$in": merchant_shop_ids},
-        "is_archived": False,
-    }
-
-    # --- 3. On ajoute la logique de filtre en utilisant la bonne variable 'status' ---
+    # 2. Filtre sur les sous-commandes du marchand
+    sub_order_filter = {"shop_id": {"$in": merchant_shop_ids}}
     if status_filter == "en_cours":
-        match_filter["sub_orders.status"] = {
-            "$in": ["En attente", "En cours de livraison"]
-        }
+        sub_order_filter["status"] = {"$in": ["En attente", "En cours de livraison"]}
     elif status_filter and status_filter != "toutes":
-        match_filter["sub_orders.status"] = status_filter
+        sub_order_filter["status"] = status_filter
     # Si status_filter est "toutes", on n'ajoute aucun filtre de statut.
 
-    # 4. Pipeline pour trouver les commandes
+    # 3. Groupement par boutique dans MongoDB : une ligne par sous-commande du
+    # marchand, puis les `limit + 1` plus récentes par boutique
     pipeline = [
-        {"$match": match_filter},
-        {"$sort": {"created_at": -1}},
+        {
+            "$match": {
+                "sub_orders": {"$elemMatch": sub_order_filter},
+                "is_archived": False,
+            }
+        },
+        *keyset_stages(page, "created_at"),
+        {"$unwind": "$sub_orders"},
+        {
+            "$match": {
+                f"sub_orders.{field}": value
+                for field, value in sub_order_filter.items()
+            }
+        },
+        {
+            "$group": {
+                "_id": "$sub_orders.shop_id",
+                "total": {"$sum": 1},
+                "orders": {
+                    "$firstN": {
+                        "n": page.limit + 1,
+                        "input": {
+                            "$mergeObjects": [
+                                "$$ROOT",
+                                {"sub_orders": ["$sub_orders"]},
+                            ]
+                        },
+                    }
+                },
+            }
+        },
         {
             "$lookup": {
                 "from": "users",
-                "localField": "user_id",
+                "localField": "orders.user_id",
                 "foreignField": "_id",
-                "as": "customer",
+                "pipeline": [{"$project": CUSTOMER_PROJECTION}],
+                "as": "customers",
             }
         },
-        {"$unwind": "$customer"},
     ]
-    all_relevant_orders = await orders.aggregate(pipeline).to_list(length=None)
+    groups = {
+        group["_id"]: group
+        for group in await orders.aggregate(pipeline).to_list(length=None)
+    }
 
-    # 5. Organiser les commandes par boutique en Python
+    # 4. Une entrée par boutique, même sans commande
     response_data = []
     for shop in merchant_shops:
-        shop_id_str = str(shop["_id"])
-        orders_for_this_shop = []
-        for order in all_relevant_orders:
-            if any(
-                str(so.get("shop_id")) == shop_id_str
-                for so in order.get("sub_orders", [])
-            ):
-                # Conversion manuelle des IDs
-                order["_id"] = str(order["_id"])
-                order["user_id"] = str(order["user_id"])
-                order["customer"]["_id"] = str(order["customer"]["_id"])
-                for sub in order.get("sub_orders", []):
-                    sub["shop_id"] = str(sub["shop_id"])
-                orders_for_this_shop.append(order)
+        group = groups.get(shop["_id"], {"total": 0, "orders": [], "customers": []})
+        customers = {c["_id"]: c for c in group["customers"]}
+        shop_orders = group["orders"][: page.limit]
+        next_cursor = None
+        if len(group["orders"]) > page.limit:
+            last = shop_orders[-1]
+            next_cursor = encode_cursor(last["created_at"], last["_id"])
+
+        for order in shop_orders:
+            order["customer"] = customers.get(order["user_id"])
 
         response_data.append(
             {
-                "shop_id": shop_id_str,
+                "shop_id": str(shop["_id"]),
                 "shop_name": shop["name"],
-                "orders": [OrderOut.model_validate(o) for o in orders_for_this_shop],
+                "total": group["total"],
+                "next_cursor": next_cursor,
+                "orders": shop_orders,
             }
         )
 
-    return response_data
+    return model_response(List[ShopWithOrders], response_data)
 
 
 @router.patch("/orders/{order_id}/sub_orders/{shop_id}/status", response_model=OrderOut)
@@ -95,53 +146,23 @@ async def update_sub_order_status(
     current_user: UserOut = Depends(get_current_merchant),
 ):
     """
-    Met à jour le statut d'une sous-commande et recalcule le statut global de la commande.
+    Met à jour le statut d'une sous-commande et recalcule le statut global de la commande
+    (voir `app/services/orders_services.py`).
     """
-    if not ObjectId.is_valid(order_id):
+    if not ObjectId.is_valid(order_id) or not ObjectId.is_valid(shop_id):
         raise HTTPException(status_code=400, detail="ID de commande invalide.")
 
-    # --- CORRECTION : On cherche le shop_id en tant que string ---
-    query = {"_id": ObjectId(order_id), "sub_orders.shop_id": ObjectId(shop_id)}
-    update = {"$set": {"sub_orders.$.status": status}}
-    # 1. Mise à jour de la sous-commande
-    updated_doc = await orders.find_one_and_update(query, update)
-    if not updated_doc:
+    # Le marchand ne peut modifier que les sous-commandes de ses boutiques
+    if not await shops.find_one(
+        {"_id": ObjectId(shop_id), "owner_id": ObjectId(current_user.id)}, {"_id": 1}
+    ):
         raise HTTPException(
             status_code=404,
             detail="Commande non trouvée ou non autorisée pour cette boutique.",
         )
 
-    # 2. On récupère la commande complète pour recalculer le statut global
-    updated_order_doc = await orders.find_one({"_id": ObjectId(order_id)})
-
-    # 3. Logique de mise à jour du statut global
-    sub_statuses = [so["status"] for so in updated_order_doc.get("sub_orders", [])]
-    new_global_status = updated_order_doc["status"]
-    if all(s == "Livrée" for s in sub_statuses):
-        new_global_status = "Livrée"
-    elif any(s == "En cours de livraison" for s in sub_statuses):
-        new_global_status = "En cours de livraison"
-    elif all(s == "Annulée" for s in sub_statuses):
-        new_global_status = "Annulée"
-
-    # 4. On met à jour le statut global dans la BDD
-    if new_global_status != updated_order_doc["status"]:
-        await orders.update_one(
-            {"_id": ObjectId(order_id)}, {"$set": {"status": new_global_status}}
-        )
-        updated_order_doc["status"] = new_global_status
-
-    # 5. On enrichit et on renvoie la commande finale
-    customer = await users.find_one({"_id": updated_order_doc["user_id"]})
-    if customer:
-        updated_order_doc["customer"] = customer
-
-    # Conversion manuelle
-    updated_order_doc["_id"] = str(updated_order_doc["_id"])
-    updated_order_doc["user_id"] = str(updated_order_doc["user_id"])
-    if updated_order_doc.get("customer"):
-        updated_order_doc["customer"]["_id"] = str(updated_order_doc["customer"]["_id"])
-    for sub in updated_order_doc.get("sub_orders", []):
-        sub["shop_id"] = str(sub["shop_id"])
-
-    return OrderOut.model_validate(updated_order_doc)
+    updated_order_doc = await orders_services.update_sub_order_status(
+        ObjectId(order_id), ObjectId(shop_id), status
+    )
+    updated_order_doc = await orders_services.with_customer(updated_order_doc)
+    return model_response(OrderOut, updated_order_doc)
@@ -1,13 +1,16 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Response
 from typing import List
 from datetime import datetime
 from bson import ObjectId
 
-from app.db.database import orders, shops, users
+from app.db.database import orders, shops
 from app.schemas.order import OrderCreate, OrderOut
 from app.schemas.users import UserOut
 from app.core.dependencies import get_current_user
-from app.core.email import send_email
+from app.core.email import enqueue_emails
+from app.services.stats_services import increment
+from app.utils.pagination import PageParams, finalize_page, find_page, page_params
+from app.utils.responses import model_response
 
 router = APIRouter()
 
@@ -41,62 +44,84 @@ async def create_order(
         "is_archived": False,
     }
 
-    result = await orders.insert_one(new_order_doc)
-    created_order = await orders.find_one({"_id": result.inserted_id})
+    # insert_one complète `new_order_doc` avec son `_id` : pas de relecture
+    await orders.insert_one(new_order_doc)
+    created_order = new_order_doc
+    await increment("orders_pending")
 
     # --- ENVOI DES NOTIFICATIONS AUX MARCHANDS ---
+    # Boutiques et propriétaires de tout le panier en une seule requête
+    shop_ids = list({sub_order["shop_id"] for sub_order in sub_orders_for_db})
+    recipients = await shops.aggregate(
+        [
+            {"$match": {"_id": {"$in": shop_ids}}},
+            {
+                "$lookup": {
+                    "from": "users",
+                    "localField": "owner_id",
+                    "foreignField": "_id",
+                    "pipeline": [{"$project": {"email": 1, "first_name": 1}}],
+                    "as": "owner",
+                }
+            },
+            {"$unwind": "$owner"},
+            {"$project": {"name": 1, "owner": 1}},
+        ]
+    ).to_list(length=None)
+    shops_by_id = {shop["_id"]: shop for shop in recipients}
+
+    notifications = []
     for sub_order in created_order.get("sub_orders", []):
-        shop = await shops.find_one({"_id": sub_order["shop_id"]})
-        if shop:
-            owner = await users.find_one({"_id": shop["owner_id"]})
-            if owner and owner.get("email"):
-                # On construit la liste des produits pour l'email
-                products_html_list = "<ul>"
-                for product in sub_order.get("products", []):
-                    products_html_list += (
-                        f"<li>{product['name']} (Quantité: {product['quantity']})</li>"
-                    )
-                products_html_list += "</ul>"
-
-                subject = f"🎉 Nouvelle commande sur Ahimin pour votre boutique {shop['name']} !"
-                html_content = f"""
-                <h3>Bonjour {owner['first_name']},</h3>
-                <p>Excellente nouvelle ! Vous avez reçu une nouvelle commande.</p>
-                <p><strong>Détails :</strong></p>
-                {products_html_list}
-                <p><strong>Adresse de livraison du client :</strong> {created_order['shipping_address']}</p>
-                <p><strong>Numéro de contact du client :</strong> {created_order['contact_phone']}</p>
-                <p>Veuillez vous connecter à votre tableau de bord pour la traiter.</p>
-                """
-                await send_email(
-                    to_email=owner["email"], subject=subject, html_content=html_content
+        shop = shops_by_id.get(sub_order["shop_id"])
+        if shop and shop["owner"].get("email"):
+            owner = shop["owner"]
+            # On construit la liste des produits pour l'email
+            products_html_list = "<ul>"
+            for product in sub_order.get("products", []):
+                products_html_list += (
+                    f"<li>{product['name']} (Quantité: {product['quantity']})</li>"
                 )
-    # ---------------------------------------------
+            products_html_list += "</ul>"
 
-    # Conversion manuelle des IDs pour la réponse
-    created_order["_id"] = str(created_order["_id"])
-    created_order["user_id"] = str(created_order["user_id"])
-    for sub in created_order.get("sub_orders", []):
-        sub["shop_id"] = str(sub["shop_id"])
+            subject = (
+                f"🎉 Nouvelle commande sur Ahimin pour votre boutique {shop['name']} !"
+            )
+            html_content = f"""
+            <h3>Bonjour {owner['first_name']},</h3>
+            <p>Excellente nouvelle ! Vous avez reçu une nouvelle commande.</p>
+            <p><strong>Détails :</strong></p>
+            {products_html_list}
+            <p><strong>Adresse de livraison du client :</strong> {created_order['shipping_address']}</p>
+            <p><strong>Numéro de contact du client :</strong> {created_order['contact_phone']}</p>
+            <p>Veuillez vous connecter à votre tableau de bord pour la traiter.</p>
+            """
+            notifications.append(
+                {
+                    "to_email": owner["email"],
+                    "subject": subject,
+                    "html_content": html_content,
+                }
+            )
+    await enqueue_emails(notifications)
+    # ---------------------------------------------
 
-    return OrderOut.model_validate(created_order)
+    return model_response(OrderOut, created_order)
 
 
 @router.get("/my-orders", response_model=List[OrderOut])
 async def get_my_orders(
-    current_user: UserOut = Depends(get_current_user), archived: bool = False
+    response: Response,
+    current_user: UserOut = Depends(get_current_user),
+    archived: bool = False,
+    page: PageParams = Depends(page_params(default=50, maximum=200)),
 ):
 
     query = {"user_id": ObjectId(current_user.id), "is_archived": archived}
-    user_orders = await orders.find(query).sort("created_at", -1).to_list(length=None)
-
-    for order in user_orders:
-        order["_id"] = str(order["_id"])
-        order["user_id"] = str(order["user_id"])
-        for sub in order.get("sub_orders", []):
-            sub["shop_id"] = str(sub["shop_id"])
-
-    return [OrderOut.model_validate(order) for order in user_orders]
+    cursor = find_page(orders, query, page, "created_at")
+    user_orders = finalize_page(
+        await cursor.to_list(length=None), page, response, "created_at"
+    )
+    return model_response(List[OrderOut], user_orders, response)
 
 
 @router.patch("/{order_id}/archive", response_model=OrderOut)
@@ -120,13 +145,7 @@ async def archive_order(
             status_code=404, detail="Commande non trouvée ou non autorisée."
         )
 
-    # --- AJOUT : Conversion manuelle des IDs ---
-    updated_order["_id"] = str(updated_order["_id"])
-    updated_order["user_id"] = str(updated_order["user_id"])
-    for sub in updated_order.get("sub_orders", []):
-        sub["shop_id"] = str(sub["shop_id"])
-
-    return OrderOut.model_validate(updated_order)
+    return model_response(OrderOut, updated_order)
 
 
 @router.patch("/{order_id}/unarchive", response_model=OrderOut)
@@ -150,10 +169,4 @@ async def unarchive_order(
             status_code=404, detail="Commande non trouvée ou non autorisée."
         )
 
-    # --- AJOUT : Conversion manuelle des IDs ---
-    updated_order["_id"] = str(updated_order["_id"])
-    updated_order["user_id"] = str(updated_order["user_id"])
-    for sub in updated_order.get("sub_orders", []):
-        sub["shop_id"] = str(sub["shop_id"])
-
-    return OrderOut.model_validate(updated_order)
+    return model_response(OrderOut, updated_order)
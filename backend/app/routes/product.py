@@ -1,12 +1,32 @@
 from bson import ObjectId
-from fastapi import APIRouter, HTTPException, Depends, UploadFile, File, Form
-from typing import List
+from fastapi import (
+    APIRouter,
+    HTTPException,
+    Depends,
+    Request,
+    Response,
+    UploadFile,
+    File,
+    Form,
+)
+from typing import List, Union
 
 from app.core.cloudinary import upload_images_to_cloudinary
 from app.core.dependencies import get_current_merchant
 from app.db.database import products, shops
-from app.schemas.product import ProductOut, ProductWithShopInfo
+from app.schemas.product import (
+    PRODUCT_FIELDSETS,
+    ProductCard,
+    ProductOut,
+    ProductWithShopInfo,
+)
 from app.schemas.users import UserOut
+from app.services import versions_services
+from app.services.products_services import denormalized_fields, is_shop_visible
+from app.utils.fieldsets import Fieldset, fields_param
+from app.utils.http_cache import cached_response, conditional_get
+from app.utils.pagination import PageParams, finalize_page, find_page, page_params
+from app.utils.responses import model_response
 
 router = APIRouter()
 
@@ -40,29 +60,19 @@ async def create_product(
             status_code=500, detail="Erreur lors du téléversement des images."
         )
 
-    # 3. Créer le document produit
+    # 3. Créer le document produit (avec les champs dénormalisés de la boutique)
     product_data = {
         "name": name,
         "description": description,
         "price": price,
         "images": image_urls,
         "shop_id": ObjectId(shop_id),
+        **denormalized_fields(shop, current_user.model_dump()),
     }
     result = await products.insert_one(product_data)
+    await versions_services.bump_product(shop["_id"], result.inserted_id)
     created_product = await products.find_one({"_id": result.inserted_id})
 
-    # --- CORRECTION : Enrichir le produit avant de le renvoyer ---
-    created_product["shop"] = {
-        "_id": shop.get("_id"),
-        "name": shop.get("name"),
-        "contact_phone": shop.get("contact_phone"),
-    }
-
-    # Conversion manuelle des IDs
-    created_product["_id"] = str(created_product["_id"])
-    created_product["shop_id"] = str(created_product["shop_id"])
-    created_product["shop"]["_id"] = str(created_product["shop"]["_id"])
-
     return ProductOut.model_validate(created_product)
 
 
@@ -109,6 +119,7 @@ async def update_product(
         raise HTTPException(status_code=400, detail="Aucune donnée à mettre à jour")
 
     await products.update_one({"_id": object_id}, {"$set": update_data})
+    await versions_services.bump_product(shop_of_product["_id"], object_id)
     updated_product = await products.find_one({"_id": object_id})
     return ProductOut(**updated_product)
 
@@ -136,6 +147,7 @@ async def delete_product(
         raise HTTPException(
             status_code=404, detail="Produit non trouvé lors de la suppression"
         )
+    await versions_services.bump_product(shop["_id"], object_id)
 
     return {"message": "Produit supprimé avec Succès ✅ "}
 
@@ -145,8 +157,16 @@ async def delete_product(
 # ===============================================================
 
 
-@router.get("/{shop_id}/products/", response_model=List[ProductWithShopInfo])
-async def get_public_products_by_shop(shop_id: str):
+@router.get(
+    "/{shop_id}/products/",
+    response_model=List[Union[ProductWithShopInfo, ProductCard]],
+)
+async def get_public_products_by_shop(
+    shop_id: str,
+    request: Request,
+    response: Response,
+    fieldset: Fieldset = Depends(fields_param(PRODUCT_FIELDSETS)),
+):
     """
     Récupère les produits d'une boutique, en s'assurant que la boutique
     est visible et que chaque produit est enrichi avec les infos complètes de sa boutique.
@@ -154,52 +174,40 @@ async def get_public_products_by_shop(shop_id: str):
     if not ObjectId.is_valid(shop_id):
         raise HTTPException(status_code=400, detail="ID de boutique invalide")
 
-    # 1. On valide que la boutique parente est bien visible par le public
-    validation_pipeline = [
-        {"$match": {"_id": ObjectId(shop_id), "is_published": True}},
-        {
-            "$lookup": {
-                "from": "users",
-                "localField": "owner_id",
-                "foreignField": "_id",
-                "as": "owner_details",
-            }
-        },
-        {"$unwind": "$owner_details"},
-        {"$match": {"owner_details.is_active": True}},
-    ]
-    valid_shop_list = await shops.aggregate(validation_pipeline).to_list(length=1)
-    if not valid_shop_list:
-        raise HTTPException(
-            status_code=404,
-            detail="Boutique non trouvée, non publiée, ou propriétaire inactif.",
-        )
-
-    shop_data = valid_shop_list[0]
-
-    # 2. Si la boutique est valide, on récupère ses produits
-    products_cursor = products.find({"shop_id": ObjectId(shop_id)})
-
-    # 3. On enrichit chaque produit avec les infos de la boutique avant de le renvoyer
-    product_list = []
-    async for product in products_cursor:
-        product_info = {
-            **product,
-            "shop": {
-                "_id": shop_data.get("_id"),
-                "name": shop_data.get("name"),
-                "contact_phone": shop_data.get("contact_phone"),
-                "category": shop_data.get("category"),
-                "location": shop_data.get("location")
-            },
-        }
-        product_list.append(ProductWithShopInfo.model_validate(product_info))
-
-    return product_list
+    not_modified = await conditional_get(
+        request, response, versions_services.shop_products_key(shop_id)
+    )
+    if not_modified:
+        return not_modified
+
+    async def load():
+        # Les produits portent `is_visible` et l'instantané de leur boutique :
+        # une seule requête indexée suffit.
+        product_list = await products.find(
+            {"shop_id": ObjectId(shop_id), "is_visible": True}, fieldset.projection
+        ).to_list(length=None)
+
+        # Liste vide : boutique invisible (404) ou simplement sans produits
+        if not product_list and not await is_shop_visible(ObjectId(shop_id)):
+            raise HTTPException(
+                status_code=404,
+                detail="Boutique non trouvée, non publiée, ou propriétaire inactif.",
+            )
+        return product_list
+
+    return await cached_response(
+        request,
+        response,
+        List[fieldset.model],
+        load,
+        versions_services.shop_products_key(shop_id),
+    )
 
 
 @router.get("/{product_id}", response_model=ProductWithShopInfo)
-async def get_public_product_by_id(product_id: str):
+async def get_public_product_by_id(
+    product_id: str, request: Request, response: Response
+):
     """
     Récupère un seul produit, en vérifiant que sa boutique
     est publiée ET que son marchand est actif.
@@ -209,120 +217,53 @@ async def get_public_product_by_id(product_id: str):
     except Exception:
         raise HTTPException(status_code=400, detail="ID du produit invalide")
 
-    pipeline = [
-        {"$match": {"_id": object_id}},
-        {
-            "$lookup": {
-                "from": "shops",
-                "localField": "shop_id",
-                "foreignField": "_id",
-                "as": "shop_details",
-            }
-        },
-        {"$unwind": "$shop_details"},
-        {"$match": {"shop_details.is_published": True}},
-        # --- On ajoute la vérification du statut du marchand ---
-        {
-            "$lookup": {
-                "from": "users",
-                "localField": "shop_details.owner_id",
-                "foreignField": "_id",
-                "as": "owner_details",
-            }
-        },
-        {"$unwind": "$owner_details"},
-        {"$match": {"owner_details.is_active": True}},
-        # Le $project reste le même
-        {
-            "$project": {
-                "_id": 1,
-                "name": 1,
-                "description": 1,
-                "price": 1,
-                "images": 1,
-                "shop_id": 1,
-                "seller": "$owner_details.first_name",
-                "shop": {
-                    "_id": "$shop_details._id",
-                    "name": "$shop_details.name",
-                    "contact_phone": "$shop_details.contact_phone",
-                },
-            }
-        },
-    ]
-
-    result_list = await products.aggregate(pipeline).to_list(length=1)
-    if not result_list:
-        raise HTTPException(
-            status_code=404,
-            detail="Produit non trouvé, non publié, ou son vendeur est inactif",
-        )
+    not_modified = await conditional_get(
+        request, response, versions_services.product_key(object_id)
+    )
+    if not_modified:
+        return not_modified
 
-    return result_list[0]
+    async def load():
+        product = await products.find_one({"_id": object_id, "is_visible": True})
+        if not product:
+            raise HTTPException(
+                status_code=404,
+                detail="Produit non trouvé, non publié, ou son vendeur est inactif",
+            )
+        return product
+
+    return await cached_response(
+        request,
+        response,
+        ProductWithShopInfo,
+        load,
+        versions_services.product_key(object_id),
+    )
 
 
-@router.get("/public-products/", response_model=List[ProductWithShopInfo])
-async def get_public_products():
+@router.get(
+    "/public-products/",
+    response_model=List[Union[ProductWithShopInfo, ProductCard]],
+)
+async def get_public_products(
+    request: Request,
+    response: Response,
+    page: PageParams = Depends(page_params(default=50, maximum=100)),
+    fieldset: Fieldset = Depends(fields_param(PRODUCT_FIELDSETS)),
+):
     """
-    Récupère tous les produits publics, enrichis avec les informations de leur boutique.
-    Un produit est public si sa boutique est publiée ET si son propriétaire est actif.
+    Récupère les produits publics, enrichis avec les informations de leur boutique,
+    du plus récent au plus ancien et paginés par curseur (en-tête `X-Next-Cursor`).
+    Un produit est public si sa boutique est publiée ET si son propriétaire est actif
+    (champ dénormalisé `is_visible`). `fields=card` ne renvoie que les champs
+    d'une carte produit (nom, prix, première image, boutique).
     """
-    pipeline = [
-        # Étape 1 : Joindre les informations de la boutique
-        {
-            "$lookup": {
-                "from": "shops",
-                "localField": "shop_id",
-                "foreignField": "_id",
-                "as": "shop_details",
-            }
-        },
-        {"$unwind": "$shop_details"},
-        # Étape 2 : Joindre les informations du propriétaire de la boutique
-        {
-            "$lookup": {
-                "from": "users",
-                "localField": "shop_details.owner_id",
-                "foreignField": "_id",
-                "as": "owner_details",
-            }
-        },
-        {"$unwind": "$owner_details"},
-        # Étape 3 : Filtrer pour ne garder que les produits valides
-        {
-            "$match": {
-                "shop_details.is_published": True,
-                "owner_details.is_active": True,
-            }
-        },
-        # Étape 4 : Projeter la forme finale de la donnée
-        {
-            "$project": {
-                "_id": 1,
-                "name": 1,
-                "description": 1,
-                "price": 1,
-                "images": 1,
-                "shop_id": 1,
-                "shop": {
-                    "_id": "$shop_details._id",
-                    "name": "$shop_details.name",
-                    "contact_phone": "$shop_details.contact_phone",
-                    "category": "$shop_details.category",
-                    "location": "$shop_details.location",
-                },
-            }
-        },
-        {"$limit": 50},
-    ]
-
-    product_list_from_db = await products.aggregate(pipeline).to_list(length=None)
-
-    # Conversion manuelle des IDs pour la validation Pydantic
-    for p in product_list_from_db:
-        p["_id"] = str(p["_id"])
-        p["shop_id"] = str(p["shop_id"])
-        if p.get("shop"):
-            p["shop"]["_id"] = str(p["shop"]["_id"])
-
-    return [ProductWithShopInfo.model_validate(p) for p in product_list_from_db]
+    not_modified = await conditional_get(request, response, versions_services.PRODUCTS)
+    if not_modified:
+        return not_modified
+
+    product_list = await find_page(
+        products, {"is_visible": True}, page, projection=fieldset.projection
+    ).to_list(length=None)
+    product_list = finalize_page(product_list, page, response)
+    return model_response(List[fieldset.model], product_list, response)
@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from typing import List
 from datetime import datetime
 from bson import ObjectId
@@ -6,6 +6,11 @@ from bson import ObjectId
 from app.db.database import reviews  # Assurez-vous d'avoir une collection 'reviews'
 from app.schemas.review import ReviewCreate, ReviewOut, ReviewWithShopInfo
 from app.schemas.users import UserOut
+from app.services import versions_services
+from app.services.reviews_services import apply_rating
+from app.utils.http_cache import conditional_get
+from app.utils.pagination import PageParams, finalize_page, find_page, page_params
+from app.utils.responses import model_response
 
 # Cette dépendance doit pouvoir récupérer n'importe quel utilisateur connecté
 from app.core.dependencies import get_current_user
@@ -43,27 +48,40 @@ async def create_review(
     }
 
     result = await reviews.insert_one(new_review)
+    await apply_rating(new_review["shop_id"], new_review["rating"])
+    await versions_services.bump_reviews(new_review["shop_id"])
     created_review = await reviews.find_one({"_id": result.inserted_id})
 
     return ReviewOut(**created_review)
 
 
 @router.get("/shop/{shop_id}", response_model=List[ReviewOut])
-async def get_reviews_for_shop(shop_id: str):
+async def get_reviews_for_shop(
+    shop_id: str,
+    request: Request,
+    response: Response,
+    page: PageParams = Depends(page_params(default=100, maximum=100)),
+):
     """
-    Route publique pour récupérer tous les avis d'une boutique spécifique.
+    Route publique pour récupérer les avis d'une boutique spécifique,
+    paginés par curseur (en-tête `X-Next-Cursor`).
     """
     if not ObjectId.is_valid(shop_id):
         raise HTTPException(status_code=400, detail="ID de la boutique invalide")
 
-    # On trie par date pour afficher les plus récents en premier
-    cursor = reviews.find({"shop_id": ObjectId(shop_id)}).sort("created_at", -1)
+    not_modified = await conditional_get(
+        request, response, versions_services.reviews_key(shop_id)
+    )
+    if not_modified:
+        return not_modified
 
-    review_list = await cursor.to_list(
-        length=100
-    )  # On limite à 100 avis pour la performance
+    # On trie par date pour afficher les plus récents en premier
+    cursor = find_page(reviews, {"shop_id": ObjectId(shop_id)}, page, "created_at")
+    review_list = finalize_page(
+        await cursor.to_list(length=None), page, response, "created_at"
+    )
 
-    return [ReviewOut(**review) for review in review_list]
+    return model_response(List[ReviewOut], review_list, response)
 
 
 @router.get("/my-reviews", response_model=List[ReviewWithShopInfo])
@@ -89,7 +107,7 @@ async def get_my_reviews(current_user: UserOut = Depends(get_current_user)):
     ]
 
     user_reviews = await reviews.aggregate(pipeline).to_list(length=None)
-    return [ReviewWithShopInfo.model_validate(review) for review in user_reviews]
+    return model_response(List[ReviewWithShopInfo], user_reviews)
 
 
 @router.delete("/{review_id}", response_model=dict)
@@ -110,5 +128,10 @@ async def delete_review(
     if review_to_delete["user_id"] != ObjectId(current_user.id):
         raise HTTPException(status_code=403, detail="Action non autorisée")
 
-    await reviews.delete_one({"_id": ObjectId(review_id)})
+    result = await reviews.delete_one({"_id": ObjectId(review_id)})
+    if result.deleted_count:
+        await apply_rating(
+            review_to_delete["shop_id"], review_to_delete["rating"], delta=-1
+        )
+        await versions_services.bump_reviews(review_to_delete["shop_id"])
     return {"message": "Avis supprimé avec Succès ✅ ."}
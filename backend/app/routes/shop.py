@@ -1,14 +1,46 @@
-import httpx
 from bson import ObjectId
-from fastapi import APIRouter, Form, File, HTTPException, UploadFile, Depends
-from typing import List, Optional
+from fastapi import (
+    APIRouter,
+    Form,
+    File,
+    HTTPException,
+    Request,
+    Response,
+    UploadFile,
+    Depends,
+)
+from typing import List, Optional, Union
 
 from app.db.database import products, shops
 from app.core.cloudinary import upload_images_to_cloudinary
 from app.core.dependencies import get_current_merchant
-from app.schemas.shop import ShopOut, ShopBase, ShopWithContact
+from app.schemas.shop import (
+    SHOP_FIELDSETS,
+    ShopBase,
+    ShopCard,
+    ShopOut,
+    ShopWithContact,
+)
 from app.schemas.users import UserOut
-from app.schemas.product import ProductOut, ProductWithShopInfo
+from app.schemas.product import (
+    PRODUCT_FIELDSETS,
+    ProductCard,
+    ProductOut,
+    ProductWithShopInfo,
+)
+from app.services import geocoding, versions_services
+from app.services.products_services import is_shop_visible, sync_shop_products
+from app.services.reviews_services import empty_rating_fields
+from app.utils.fieldsets import Fieldset, fields_param
+from app.utils.http_cache import cached_response, conditional_get
+from app.utils.pagination import (
+    PageParams,
+    finalize_page,
+    keyset_stages,
+    limit_stage,
+    page_params,
+)
+from app.utils.responses import model_response
 
 router = APIRouter()
 
@@ -28,27 +60,10 @@ async def create_shop(
 ):
     image_urls = await upload_images_to_cloudinary(images)
     geolocation = None
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.get(
-                "https://nominatim.openstreetmap.org/search",
-                params={
-                    "q": location,
-                    "format": "json",
-                    "limit": 1,
-                    "countrycodes": "bj",
-                },
-                headers={"User-Agent": "AriminApp/1.0"},
-            )
-            response.raise_for_status()
-            if response.json():
-                loc_data = response.json()[0]
-                geolocation = {
-                    "type": "Point",
-                    "coordinates": [float(loc_data["lon"]), float(loc_data["lat"])],
-                }
-        except Exception as e:
-            print(f"Avertissement géocodage : {e}")
+    try:
+        geolocation = await geocoding.geocode(location)
+    except Exception as e:
+        print(f"Avertissement géocodage : {e}")
 
     shop_data = {
         "name": name,
@@ -60,6 +75,7 @@ async def create_shop(
         "geolocation": geolocation,
         "is_published": False,
         "contact_phone": current_user.phone,
+        **empty_rating_fields(),
     }
 
     new_shop_result = await shops.insert_one(shop_data)
@@ -74,13 +90,20 @@ async def create_shop(
 
 @router.get("/my-shops/", response_model=List[ShopOut])
 async def get_my_shops(current_user: UserOut = Depends(get_current_merchant)):
-    cursor = shops.find({"owner_id": ObjectId(current_user.id)})
-    return [ShopOut(**shop) async for shop in cursor]
+    my_shops = await shops.find({"owner_id": ObjectId(current_user.id)}).to_list(
+        length=None
+    )
+    return model_response(List[ShopOut], my_shops)
 
 
-@router.get("/my-shops/{shop_id}/products", response_model=List[ProductOut])
+@router.get(
+    "/my-shops/{shop_id}/products",
+    response_model=List[Union[ProductOut, ProductCard]],
+)
 async def get_my_shop_products(
-    shop_id: str, current_user: UserOut = Depends(get_current_merchant)
+    shop_id: str,
+    current_user: UserOut = Depends(get_current_merchant),
+    fieldset: Fieldset = Depends(fields_param(PRODUCT_FIELDSETS)),
 ):
     """
     Récupère les produits d'une boutique spécifique appartenant au marchand connecté.
@@ -98,22 +121,20 @@ async def get_my_shop_products(
         )
 
     # 2. Si c'est bon, on récupère les produits
-    products_cursor = products.find({"shop_id": ObjectId(shop_id)})
+    product_list = await products.find(
+        {"shop_id": ObjectId(shop_id)}, fieldset.projection
+    ).to_list(length=None)
 
     # 3. On enrichit chaque produit avec les infos de la boutique
-    product_list = []
-    async for product in products_cursor:
-        product_info = {
-            **product,
-            "shop": {
-                "_id": shop_data.get("_id"),
-                "name": shop_data.get("name"),
-                "contact_phone": shop_data.get("contact_phone"),
-            },
-        }
-        product_list.append(ProductOut.model_validate(product_info))
+    shop_info = {
+        "_id": shop_data.get("_id"),
+        "name": shop_data.get("name"),
+        "contact_phone": shop_data.get("contact_phone"),
+    }
+    for product in product_list:
+        product["shop"] = shop_info
 
-    return product_list
+    return model_response(List[fieldset.model], product_list)
 
 
 @router.put("/update-shop/{shop_id}", response_model=ShopOut)
@@ -147,27 +168,10 @@ async def update_shop(
     if location is not None:
         update_data["location"] = location
         geolocation = None
-        async with httpx.AsyncClient() as client:
-            try:
-                response = await client.get(
-                    "https://nominatim.openstreetmap.org/search",
-                    params={
-                        "q": location,
-                        "format": "json",
-                        "limit": 1,
-                        "countrycodes": "bj",
-                    },
-                    headers={"User-Agent": "AriminApp/1.0"},
-                )
-                response.raise_for_status()
-                if response.json():
-                    loc_data = response.json()[0]
-                    geolocation = {
-                        "type": "Point",
-                        "coordinates": [float(loc_data["lon"]), float(loc_data["lat"])],
-                    }
-            except Exception as e:
-                print(f"Avertissement géocodage lors de la mise à jour : {e}")
+        try:
+            geolocation = await geocoding.geocode(location)
+        except Exception as e:
+            print(f"Avertissement géocodage lors de la mise à jour : {e}")
 
         update_data["geolocation"] = geolocation
 
@@ -182,6 +186,7 @@ async def update_shop(
         raise HTTPException(status_code=400, detail="Aucune donnée à mettre à jour")
 
     await shops.update_one({"_id": ObjectId(shop_id)}, {"$set": update_data})
+    await sync_shop_products(ObjectId(shop_id))
 
     updated_shop = await shops.find_one({"_id": ObjectId(shop_id)})
     return ShopOut(**updated_shop)
@@ -198,10 +203,12 @@ async def delete_shop(
         raise HTTPException(
             status_code=403, detail="Accès refusé ou boutique non trouvée"
         )
+    product_ids = await products.distinct("_id", {"shop_id": ObjectId(shop_id)})
     await products.delete_many(
         {"shop_id": ObjectId(shop_id)}
     )  # Supprime les produits associés
     await shops.delete_one({"_id": ObjectId(shop_id)})
+    await versions_services.bump_shop_catalog(ObjectId(shop_id), product_ids)
     return {"message": "Boutique et produits associés supprimés"}
 
 
@@ -217,6 +224,7 @@ async def publish_shop(
             status_code=403, detail="Accès refusé ou boutique non trouvée"
         )
     await shops.update_one({"_id": ObjectId(shop_id)}, {"$set": {"is_published": True}})
+    await sync_shop_products(ObjectId(shop_id))
     return {"message": "Boutique publiée avec Succès ✅ "}
 
 
@@ -234,6 +242,7 @@ async def unpublish_shop(
     await shops.update_one(
         {"_id": ObjectId(shop_id)}, {"$set": {"is_published": False}}
     )
+    await sync_shop_products(ObjectId(shop_id))
     return {"message": "Boutique dépubliée avec Succès ✅ "}
 
 
@@ -242,26 +251,15 @@ async def reverse_geocode_location(lat: float, lon: float):
     """
     Prend des coordonnées GPS et renvoie une adresse textuelle.
     """
-    address = "Adresse non trouvée"
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.get(
-                "https://nominatim.openstreetmap.org/reverse",
-                params={"lat": lat, "lon": lon, "format": "json"},
-                headers={"User-Agent": "AriminApp/1.0"},
-            )
-            response.raise_for_status()
-            data = response.json()
-            # On utilise le champ 'display_name' qui est l'adresse complète
-            if "display_name" in data:
-                address = data["display_name"]
-        except Exception as e:
-            print(f"Erreur de géocodage inversé: {e}")
-            raise HTTPException(
-                status_code=500, detail="Le service de géolocalisation a échoué."
-            )
+    try:
+        address = await geocoding.reverse_geocode(lat, lon)
+    except Exception as e:
+        print(f"Erreur de géocodage inversé: {e}")
+        raise HTTPException(
+            status_code=500, detail="Le service de géolocalisation a échoué."
+        )
 
-    return {"address": address}
+    return {"address": address or "Adresse non trouvée"}
 
 
 # ===============================================================
@@ -269,13 +267,25 @@ async def reverse_geocode_location(lat: float, lon: float):
 # ===============================================================
 
 
-@router.get("/public-shops/", response_model=List[ShopOut])
-async def get_public_shops():
+@router.get("/public-shops/", response_model=List[Union[ShopOut, ShopCard]])
+async def get_public_shops(
+    request: Request,
+    response: Response,
+    page: PageParams = Depends(page_params(default=50, maximum=200)),
+    fieldset: Fieldset = Depends(fields_param(SHOP_FIELDSETS)),
+):
     """
-    Liste toutes les boutiques dont le statut est "publié" ET dont le propriétaire est "actif".
+    Liste les boutiques dont le statut est "publié" ET dont le propriétaire est "actif",
+    paginées par curseur (en-tête `X-Next-Cursor`). `fields=card` ne renvoie que
+    les champs d'une carte boutique.
     """
+    not_modified = await conditional_get(request, response, versions_services.SHOPS)
+    if not_modified:
+        return not_modified
+
     pipeline = [
         {"$match": {"is_published": True}},
+        *keyset_stages(page),
         {
             "$lookup": {
                 "from": "users",
@@ -286,22 +296,35 @@ async def get_public_shops():
         },
         {"$unwind": "$owner_details"},
         {"$match": {"owner_details.is_active": True}},
+        limit_stage(page),
     ]
+    if fieldset.projection:
+        pipeline.append({"$project": fieldset.projection})
 
-    shops_cursor = shops.aggregate(pipeline)
+    async def load():
+        shop_list = await shops.aggregate(pipeline).to_list(length=None)
+        return finalize_page(shop_list, page, response)
 
     # --- CORRECTION : On utilise bien le modèle ShopOut ici ---
-    return [ShopOut(**shop) async for shop in shops_cursor]
+    return await cached_response(
+        request, response, List[fieldset.model], load, versions_services.SHOPS
+    )
 
 
 @router.get("/retrieve-shop/{shop_id}", response_model=ShopWithContact)
-async def retrieve_public_shop(shop_id: str):
+async def retrieve_public_shop(shop_id: str, request: Request, response: Response):
     """
     Récupère une seule boutique, en vérifiant qu'elle est publiée ET que son propriétaire est actif.
     """
     if not ObjectId.is_valid(shop_id):
         raise HTTPException(status_code=400, detail="ID invalide")
 
+    not_modified = await conditional_get(
+        request, response, versions_services.shop_key(shop_id)
+    )
+    if not_modified:
+        return not_modified
+
     pipeline = [
         # 1. On trouve la boutique par son ID et on s'assure qu'elle est publiée
         {"$match": {"_id": ObjectId(shop_id), "is_published": True}},
@@ -319,18 +342,30 @@ async def retrieve_public_shop(shop_id: str):
         {"$match": {"owner_details.is_active": True}},
     ]
 
-    result = await shops.aggregate(pipeline).to_list(length=1)
-    if not result:
-        raise HTTPException(
-            status_code=404,
-            detail="Boutique non trouvée, non publiée, ou propriétaire inactif.",
-        )
+    async def load():
+        result = await shops.aggregate(pipeline).to_list(length=1)
+        if not result:
+            raise HTTPException(
+                status_code=404,
+                detail="Boutique non trouvée, non publiée, ou propriétaire inactif.",
+            )
+        return result[0]
 
-    return ShopWithContact(**result[0])
+    return await cached_response(
+        request, response, ShopWithContact, load, versions_services.shop_key(shop_id)
+    )
 
 
-@router.get("/{shop_id}/products/", response_model=List[ProductWithShopInfo])
-async def get_public_products_by_shop(shop_id: str):
+@router.get(
+    "/{shop_id}/products/",
+    response_model=List[Union[ProductWithShopInfo, ProductCard]],
+)
+async def get_public_products_by_shop(
+    shop_id: str,
+    request: Request,
+    response: Response,
+    fieldset: Fieldset = Depends(fields_param(PRODUCT_FIELDSETS)),
+):
     """
     Récupère les produits d'une boutique, en s'assurant que la boutique
     est visible et que chaque produit est enrichi avec les infos complètes de sa boutique.
@@ -338,43 +373,31 @@ async def get_public_products_by_shop(shop_id: str):
     if not ObjectId.is_valid(shop_id):
         raise HTTPException(status_code=400, detail="ID de boutique invalide")
 
-    # 1. On valide que la boutique parente est bien visible par le public
-    validation_pipeline = [
-        {"$match": {"_id": ObjectId(shop_id), "is_published": True}},
-        {
-            "$lookup": {
-                "from": "users",
-                "localField": "owner_id",
-                "foreignField": "_id",
-                "as": "owner_details",
-            }
-        },
-        {"$unwind": "$owner_details"},
-        {"$match": {"owner_details.is_active": True}},
-    ]
-    valid_shop_list = await shops.aggregate(validation_pipeline).to_list(length=1)
-    if not valid_shop_list:
-        raise HTTPException(
-            status_code=404,
-            detail="Boutique non trouvée, non publiée, ou propriétaire inactif.",
-        )
-
-    shop_data = valid_shop_list[0]
-
-    # 2. Si la boutique est valide, on récupère ses produits
-    products_cursor = products.find({"shop_id": ObjectId(shop_id)})
-
-    # 3. On enrichit chaque produit avec les infos COMPLÈTES de la boutique
-    product_list = []
-    async for product in products_cursor:
-        product_info = {
-            **product,
-            "shop": {
-                "_id": shop_data.get("_id"),  # <-- C'EST CETTE LIGNE QUI MANQUAIT
-                "name": shop_data.get("name"),
-                "contact_phone": shop_data.get("contact_phone"),
-            },
-        }
-        product_list.append(ProductWithShopInfo.model_validate(product_info))
-
-    return product_list
+    not_modified = await conditional_get(
+        request, response, versions_services.shop_products_key(shop_id)
+    )
+    if not_modified:
+        return not_modified
+
+    async def load():
+        # Les produits portent `is_visible` et l'instantané de leur boutique :
+        # une seule requête indexée suffit.
+        product_list = await products.find(
+            {"shop_id": ObjectId(shop_id), "is_visible": True}, fieldset.projection
+        ).to_list(length=None)
+
+        # Liste vide : boutique invisible (404) ou simplement sans produits
+        if not product_list and not await is_shop_visible(ObjectId(shop_id)):
+            raise HTTPException(
+                status_code=404,
+                detail="Boutique non trouvée, non publiée, ou propriétaire inactif.",
+            )
+        return product_list
+
+    return await cached_response(
+        request,
+        response,
+        List[fieldset.model],
+        load,
+        versions_services.shop_products_key(shop_id),
+    )
@@ -6,6 +6,7 @@ from app.db.database import suggestions
 from app.schemas.suggestions import SuggestionCreate, SuggestionOut, SuggestionReply
 from app.schemas.users import UserOut
 from app.core.dependencies import get_current_admin
+from app.services.stats_services import increment
 from bson import ObjectId
 
 router = APIRouter()
@@ -25,5 +26,6 @@ async def create_suggestion(suggestion_data: SuggestionCreate):
         "admin_reply": None,
     }
     result = await suggestions.insert_one(new_suggestion)
+    await increment("suggestions_new")
     created_suggestion = await suggestions.find_one({"_id": result.inserted_id})
     return SuggestionOut(**created_suggestion)
@@ -4,7 +4,9 @@ from app.schemas.users import UserCreate, UserOut, UserUpdate, PasswordUpdate
 from app.services.users_services import create_user
 from bson import ObjectId
 from app.db.database import users
-from app.core.security import verify_password, get_password_hash
+from app.core.passwords import hash_password, verify_password
+from app.core.user_cache import invalidate_user
+from app.services.products_services import sync_owner_products
 
 router = APIRouter(prefix="/users", tags=["Users"])
 
@@ -43,6 +45,10 @@ async def update_current_user(
         await users.update_one(
             {"_id": ObjectId(current_user.id)}, {"$set": update_data}
         )
+        invalidate_user(current_user.id)
+        # Le prénom du marchand est recopié sur ses produits (champ `seller`)
+        if "first_name" in update_data and current_user.role == "merchant":
+            await sync_owner_products(ObjectId(current_user.id))
 
     updated_user = await users.find_one({"_id": ObjectId(current_user.id)})
     return UserOut(**updated_user)
@@ -55,14 +61,17 @@ async def update_current_user_password(
 ):
     user_in_db = await users.find_one({"_id": ObjectId(current_user.id)})
 
-    if not verify_password(password_data.current_password, user_in_db["password"]):
+    if not await verify_password(
+        password_data.current_password, user_in_db["password"]
+    ):
         raise HTTPException(
             status_code=400, detail="L'ancien mot de passe est incorrect."
         )
 
-    hashed_password = get_password_hash(password_data.new_password)
+    hashed_password = await hash_password(password_data.new_password)
     await users.update_one(
         {"_id": ObjectId(current_user.id)}, {"$set": {"password": hashed_password}}
     )
+    invalidate_user(current_user.id)
 
     return {"message": "Mot de passe mis à jour avec Succès ✅ ."}
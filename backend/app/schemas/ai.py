@@ -1,5 +1,8 @@
-from typing import Optional
-from pydantic import BaseModel
+from datetime import datetime
+from typing import Literal, Optional
+from pydantic import BaseModel, ConfigDict, Field
+
+from .pydantic_object_id import PydanticObjectId
 
 
 class GenerationRequest(BaseModel):
@@ -8,3 +11,20 @@ class GenerationRequest(BaseModel):
     category: Optional[str] = None
     location: Optional[str] = None
     description: Optional[str] = None
+
+
+class DescriptionJobOut(BaseModel):
+    id: PydanticObjectId = Field(..., alias="_id")
+    shop_id: PydanticObjectId
+    status: Literal["running", "completed", "failed"]
+    total: int
+    processed: int
+    updated: int
+    # Descriptions générées mais non écrites : saisies entre-temps par le marchand
+    skipped: int = 0
+    failed: int
+    created_at: datetime
+    finished_at: Optional[datetime] = None
+    error: Optional[str] = None
+
+    model_config = ConfigDict(populate_by_name=True, arbitrary_types_allowed=True)
@@ -1,9 +1,11 @@
 from pydantic import BaseModel
-from typing import List
+from typing import List, Optional
 from .order import OrderOut
 
 
 class ShopWithOrders(BaseModel):
     shop_id: str
     shop_name: str
+    total: int = 0  # Sous-commandes correspondant au filtre
+    next_cursor: Optional[str] = None  # Page suivante de cette boutique
     orders: List[OrderOut]
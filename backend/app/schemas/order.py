@@ -1,6 +1,7 @@
-from pydantic import BaseModel, Field, ConfigDict
+from pydantic import BaseModel, Field, ConfigDict, field_validator
 from typing import List, Optional
 from datetime import datetime
+from bson import ObjectId
 
 from app.schemas.users import UserOut
 from .pydantic_object_id import PydanticObjectId
@@ -21,6 +22,13 @@ class SubOrder(BaseModel):
     sub_total: float
     status: str = "En attente"  # <-- CHAMP CRUCIAL AJOUTÉ
 
+    @field_validator("shop_id", mode="before")
+    @classmethod
+    def convert_objectid_to_str(cls, v):
+        if isinstance(v, ObjectId):
+            return str(v)
+        return v
+
 
 # --- Schéma principal de la commande ---
 class OrderBase(BaseModel):
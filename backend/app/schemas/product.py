@@ -1,6 +1,7 @@
 from typing import List, Optional
 from pydantic import BaseModel, Field, ConfigDict
 from .pydantic_object_id import PydanticObjectId
+from app.utils.fieldsets import Fieldset
 
 # --- Schémas de base ---
 class ProductBase(BaseModel):
@@ -37,4 +38,36 @@ class ProductOut(ProductBase):
     )
 
 # On garde ce nom par cohérence, mais il pointe vers le même schéma final
-ProductWithShopInfo = ProductOut
\ No newline at end of file
+ProductWithShopInfo = ProductOut
+
+# --- Vue « carte » des listes (profil `fields=card`) ---
+class ShopCardInfo(BaseModel):
+    id: PydanticObjectId = Field(..., alias="_id")
+    name: str
+    location: Optional[str] = None
+
+class ProductCard(BaseModel):
+    id: PydanticObjectId = Field(..., alias="_id")
+    name: str
+    price: float
+    images: List[str] = Field(default=[])  # Première image seulement
+    shop_id: PydanticObjectId
+    shop: Optional[ShopCardInfo] = None
+
+    model_config = ConfigDict(populate_by_name=True)
+
+PRODUCT_CARD_PROJECTION = {
+    "name": 1,
+    "price": 1,
+    # Projection de `find()` : opérateur `$slice` numérique
+    "images": {"$slice": 1},
+    "shop_id": 1,
+    "shop._id": 1,
+    "shop.name": 1,
+    "shop.location": 1,
+}
+
+PRODUCT_FIELDSETS = {
+    "card": Fieldset(ProductCard, PRODUCT_CARD_PROJECTION),
+    "detail": Fieldset(ProductWithShopInfo),
+}
@@ -1,8 +1,15 @@
-from pydantic import BaseModel, Field, ConfigDict, field_validator
-from typing import List, Optional
+from pydantic import BaseModel, Field, ConfigDict, computed_field, field_validator
+from typing import Dict, List, Optional
 from bson import ObjectId
 
 from app.schemas.users import UserOut
+from app.utils.fieldsets import Fieldset
+
+
+def compute_rating_average(rating_sum: int, rating_count: int) -> Optional[float]:
+    if not rating_count:
+        return None
+    return round(rating_sum / rating_count, 2)
 
 
 class ShopBase(BaseModel):
@@ -20,6 +27,15 @@ class ShopOut(ShopBase):
     id: str = Field(..., alias="_id")
     owner_id: Optional[str] = None
     is_published: bool = Field(default=False)
+    # Agrégats de notes maintenus par services/reviews_services.py
+    rating_count: int = Field(default=0)
+    rating_sum: int = Field(default=0)
+    rating_histogram: Dict[str, int] = Field(default_factory=dict)
+
+    @computed_field
+    @property
+    def rating_average(self) -> Optional[float]:
+        return compute_rating_average(self.rating_sum, self.rating_count)
 
     # Le validateur ne cible que les champs définis dans la classe : 'id' et 'owner_id'
     @field_validator("id", "owner_id", mode="before")
@@ -44,3 +60,44 @@ class ShopWithContact(ShopOut):
 
 class ShopWithOwner(ShopOut):
     owner_details: UserOut
+
+
+# Vue « carte » des listes de boutiques (profil `fields=card`)
+class ShopCard(BaseModel):
+    id: str = Field(..., alias="_id")
+    name: str
+    location: str
+    category: Optional[str] = None
+    images: List[str] = Field(default=[])  # Première image seulement
+    rating_count: int = Field(default=0)
+    rating_sum: int = Field(default=0)
+
+    @computed_field
+    @property
+    def rating_average(self) -> Optional[float]:
+        return compute_rating_average(self.rating_sum, self.rating_count)
+
+    @field_validator("id", mode="before")
+    @classmethod
+    def convert_objectid_to_str(cls, v):
+        if isinstance(v, ObjectId):
+            return str(v)
+        return v
+
+    model_config = ConfigDict(populate_by_name=True)
+
+
+SHOP_CARD_PROJECTION = {
+    "name": 1,
+    "location": 1,
+    "category": 1,
+    # Étape `$project` d'une agrégation : forme expression de `$slice`
+    "images": {"$slice": ["$images", 1]},
+    "rating_count": 1,
+    "rating_sum": 1,
+}
+
+SHOP_FIELDSETS = {
+    "card": Fieldset(ShopCard, SHOP_CARD_PROJECTION),
+    "detail": Fieldset(ShopOut),
+}
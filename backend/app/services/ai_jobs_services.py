@@ -0,0 +1,267 @@
+"""
+Génération en masse des descriptions de produits d'une boutique.
+
+Une tâche (`ai_jobs`) parcourt, par ordre d'`_id` et par lots de
+`AI_BULK_BATCH_SIZE`, les produits de la boutique dont la description est
+absente ou trop courte. Les prompts sont construits comme pour
+`/ai/generate-description` (`ai_services.build_prompt`) et passent par le
+même cache et le même sémaphore. Chaque lot est écrit en un seul
+`bulk_write`, puis la progression (compteurs et dernier `_id` traité) est
+enregistrée.
+
+Reprise : la tâche met à jour `heartbeat_at` à chaque lot. Une tâche
+« running » dont le battement est plus ancien que `AI_JOB_STALE_SECONDS`
+(processus arrêté en cours de route) est reprise à partir du dernier `_id`
+traité : au démarrage par `resume_description_jobs`, ou dès qu'un nouveau
+lancement est demandé pour sa boutique. À l'arrêt de l'application,
+`stop_description_jobs` remet le battement des tâches interrompues à
+l'epoch pour qu'elles soient reprises immédiatement au redémarrage.
+"""
+
+import asyncio
+import os
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+from bson import ObjectId
+from dotenv import load_dotenv
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError, PyMongoError
+
+from app.core import metrics
+from app.db.database import ai_jobs, products, shops
+from app.schemas.ai import GenerationRequest
+from app.services import ai_services, versions_services
+
+load_dotenv()
+
+AI_BULK_BATCH_SIZE = int(os.getenv("AI_BULK_BATCH_SIZE", default=20))
+AI_JOB_STALE_SECONDS = int(os.getenv("AI_JOB_STALE_SECONDS", default=120))
+
+# Date de battement des tâches interrompues proprement : toujours périmée
+_INTERRUPTED_AT = datetime(1970, 1, 1)
+
+# Tâche asyncio -> `_id` de la tâche `ai_jobs` qu'elle exécute
+_tasks: Dict[asyncio.Task, ObjectId] = {}
+
+
+def missing_description_filter(shop_id: ObjectId) -> dict:
+    """Produits de la boutique sans description exploitable."""
+    return {
+        "shop_id": shop_id,
+        "$expr": {
+            "$lte": [
+                {"$strLenCP": {"$trim": {"input": {"$ifNull": ["$description", ""]}}}},
+                ai_services.MIN_DESCRIPTION_LENGTH,
+            ]
+        },
+    }
+
+
+def _generation_request(product: dict, shop: dict) -> GenerationRequest:
+    return GenerationRequest(
+        name=product["name"],
+        target_type="produit",
+        category=shop.get("category"),
+        location=shop.get("location"),
+        description=product.get("description"),
+    )
+
+
+async def _describe(product: dict, shop: dict) -> str:
+    prompt = ai_services.build_prompt(_generation_request(product, shop))
+    return await ai_services.generate_text(prompt)
+
+
+async def _run_job(job: dict, shop: dict) -> None:
+    job_id = job["_id"]
+    query = missing_description_filter(shop["_id"])
+    last_id = job.get("last_product_id")
+    try:
+        while True:
+            batch_query = dict(query)
+            if last_id is not None:
+                batch_query["_id"] = {"$gt": last_id}
+            batch = (
+                await products.find(batch_query, {"name": 1, "description": 1})
+                .sort("_id", 1)
+                .to_list(length=AI_BULK_BATCH_SIZE)
+            )
+            if not batch:
+                break
+
+            results = await asyncio.gather(
+                *(_describe(product, shop) for product in batch),
+                return_exceptions=True,
+            )
+            described = {
+                product["_id"]: text
+                for product, text in zip(batch, results)
+                if isinstance(text, str) and text.strip()
+            }
+            # Même filtre qu'à la lecture : une description saisie par le
+            # marchand pendant la génération n'est pas écrasée
+            updates = [
+                UpdateOne({**query, "_id": product_id}, {"$set": {"description": text}})
+                for product_id, text in described.items()
+            ]
+            updated = 0
+            if updates:
+                result = await products.bulk_write(updates, ordered=False)
+                updated = result.matched_count
+                await versions_services.bump_product(shop["_id"], *described)
+            skipped = len(updates) - updated
+            failed = len(batch) - len(updates)
+            metrics.incr("ai_jobs.products_updated", updated)
+            if skipped:
+                metrics.incr("ai_jobs.products_skipped", skipped)
+            if failed:
+                metrics.incr("ai_jobs.products_failed", failed)
+
+            last_id = batch[-1]["_id"]
+            await ai_jobs.update_one(
+                {"_id": job_id},
+                {
+                    "$inc": {
+                        "processed": len(batch),
+                        "updated": updated,
+                        "skipped": skipped,
+                        "failed": failed,
+                    },
+                    "$set": {
+                        "last_product_id": last_id,
+                        "heartbeat_at": datetime.utcnow(),
+                    },
+                },
+            )
+
+        await ai_jobs.update_one(
+            {"_id": job_id},
+            {"$set": {"status": "completed", "finished_at": datetime.utcnow()}},
+        )
+    except asyncio.CancelledError:
+        # Arrêt de l'application : la tâche reste "running" et sera reprise
+        raise
+    except Exception as e:
+        print(f"Erreur de la tâche de descriptions {job_id} : {e}")
+        await ai_jobs.update_one(
+            {"_id": job_id},
+            {
+                "$set": {
+                    "status": "failed",
+                    "error": str(e),
+                    "finished_at": datetime.utcnow(),
+                }
+            },
+        )
+
+
+def _start(job: dict, shop: dict) -> None:
+    task = asyncio.create_task(_run_job(job, shop))
+    _tasks[task] = job["_id"]
+    task.add_done_callback(lambda done: _tasks.pop(done, None))
+
+
+def _stale_before() -> datetime:
+    return datetime.utcnow() - timedelta(seconds=AI_JOB_STALE_SECONDS)
+
+
+async def _claim_stale(query: dict) -> Optional[dict]:
+    """Réserve atomiquement une tâche interrompue : un seul processus la reprend."""
+    return await ai_jobs.find_one_and_update(
+        {
+            **query,
+            # Un lot plus long que le délai ne fait pas relancer une tâche locale
+            "_id": {"$nin": list(_tasks.values())},
+            "status": "running",
+            "heartbeat_at": {"$lt": _stale_before()},
+        },
+        {"$set": {"heartbeat_at": datetime.utcnow()}},
+        return_document=ReturnDocument.AFTER,
+    )
+
+
+async def start_description_job(shop: dict, owner_id: ObjectId) -> dict:
+    """
+    Lance la génération pour la boutique `shop` ; si une tâche est déjà en
+    cours pour cette boutique, elle est renvoyée telle quelle, après avoir été
+    relancée si elle était interrompue. L'index unique partiel
+    `shop_id_running_unique` départage deux lancements simultanés.
+    """
+    interrupted = await _claim_stale({"shop_id": shop["_id"]})
+    if interrupted:
+        _start(interrupted, shop)
+        return interrupted
+
+    running = {"shop_id": shop["_id"], "status": "running"}
+    existing = await ai_jobs.find_one(running)
+    if existing:
+        return existing
+
+    now = datetime.utcnow()
+    job = {
+        "shop_id": shop["_id"],
+        "owner_id": owner_id,
+        "status": "running",
+        "total": await products.count_documents(
+            missing_description_filter(shop["_id"])
+        ),
+        "processed": 0,
+        "updated": 0,
+        "skipped": 0,
+        "failed": 0,
+        "last_product_id": None,
+        "created_at": now,
+        "heartbeat_at": now,
+    }
+    try:
+        result = await ai_jobs.insert_one(job)
+    except DuplicateKeyError:
+        # Une autre requête a lancé la tâche entre-temps
+        existing = await ai_jobs.find_one(running)
+        if existing:
+            return existing
+        raise
+    job["_id"] = result.inserted_id
+    _start(job, shop)
+    return job
+
+
+async def get_description_job(job_id: ObjectId) -> Optional[dict]:
+    return await ai_jobs.find_one({"_id": job_id})
+
+
+async def resume_description_jobs() -> int:
+    """Reprend les tâches interrompues (appelé au démarrage). Renvoie leur nombre."""
+    resumed = 0
+    while True:
+        job = await _claim_stale({})
+        if job is None:
+            return resumed
+        shop = await shops.find_one({"_id": job["shop_id"]})
+        if shop is None:
+            await ai_jobs.update_one(
+                {"_id": job["_id"]},
+                {"$set": {"status": "failed", "error": "Boutique introuvable"}},
+            )
+            continue
+        _start(job, shop)
+        resumed += 1
+
+
+async def stop_description_jobs() -> None:
+    """Interrompt les tâches en cours, qui restent « running » et reprenables."""
+    job_ids = list(_tasks.values())
+    for task in list(_tasks):
+        task.cancel()
+    await asyncio.gather(*_tasks, return_exceptions=True)
+    if not job_ids:
+        return
+    try:
+        await ai_jobs.update_many(
+            {"_id": {"$in": job_ids}, "status": "running"},
+            {"$set": {"heartbeat_at": _INTERRUPTED_AT}},
+        )
+    except PyMongoError as e:
+        # Elles seront reprises après `AI_JOB_STALE_SECONDS`
+        print(f"Erreur à l'arrêt des tâches de descriptions : {e}")
@@ -0,0 +1,196 @@
+"""
+Génération de descriptions commerciales par IA.
+
+- Un seul client de modèle partagé par le processus (`GeminiProvider`) ;
+- les réponses sont mises en cache sous une clé dérivée du prompt normalisé :
+  un prompt déjà vu est servi sans appel au fournisseur ;
+- les demandes simultanées d'un même prompt partagent un seul appel
+  (single-flight) ;
+- un sémaphore borne le nombre d'appels en cours (`AI_MAX_CONCURRENCY`).
+
+`stream_text` renvoie le texte morceau par morceau au fil de la génération
+(route SSE `/ai/generate-description/stream`) ; le texte complet alimente le
+même cache une fois la génération terminée.
+
+`AI_PROVIDER=fake` (ou `set_provider(FakeProvider())`) remplace Gemini par un
+fournisseur local déterministe, pour travailler hors ligne.
+"""
+
+import asyncio
+import hashlib
+import os
+import unicodedata
+from typing import AsyncIterator, Dict, Optional
+
+import google.generativeai as genai
+from cachetools import TTLCache
+from dotenv import load_dotenv
+
+from app.core import metrics
+from app.schemas.ai import GenerationRequest
+
+load_dotenv()
+
+AI_PROVIDER = os.getenv("AI_PROVIDER", default="gemini")
+AI_MODEL_NAME = os.getenv("AI_MODEL_NAME", default="gemini-1.5-flash")
+AI_MAX_CONCURRENCY = int(os.getenv("AI_MAX_CONCURRENCY", default=8))
+AI_CACHE_TTL = int(os.getenv("AI_CACHE_TTL", default=86400))
+AI_CACHE_MAXSIZE = int(os.getenv("AI_CACHE_MAXSIZE", default=10000))
+# En dessous de cette longueur, une description est considérée comme absente
+MIN_DESCRIPTION_LENGTH = 10
+
+# Configuration du client Google AI avec votre clé
+genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+
+
+class GeminiProvider:
+    def __init__(self, model_name: str = AI_MODEL_NAME):
+        self.model = genai.GenerativeModel(model_name)
+
+    async def generate(self, prompt: str) -> str:
+        response = await self.model.generate_content_async(prompt)
+        return response.text
+
+    async def stream(self, prompt: str) -> AsyncIterator[str]:
+        response = await self.model.generate_content_async(prompt, stream=True)
+        async for chunk in response:
+            if chunk.text:
+                yield chunk.text
+
+
+class FakeProvider:
+    """Fournisseur hors ligne : renvoie un texte déterministe dérivé du prompt."""
+
+    async def generate(self, prompt: str) -> str:
+        return f"Description générée localement pour : {prompt[:120]}"
+
+    async def stream(self, prompt: str) -> AsyncIterator[str]:
+        words = (await self.generate(prompt)).split(" ")
+        for i, word in enumerate(words):
+            await asyncio.sleep(0)
+            yield word if i == 0 else f" {word}"
+
+
+_provider = None
+_semaphore: Optional[asyncio.Semaphore] = None
+_responses = TTLCache(maxsize=AI_CACHE_MAXSIZE, ttl=AI_CACHE_TTL)
+# Clé du prompt -> appel au fournisseur en cours
+_inflight: Dict[str, asyncio.Task] = {}
+
+
+def get_provider():
+    global _provider
+    if _provider is None:
+        _provider = FakeProvider() if AI_PROVIDER == "fake" else GeminiProvider()
+    return _provider
+
+
+def set_provider(provider) -> None:
+    """Remplace le fournisseur (ex. `FakeProvider()` dans les tests)."""
+    global _provider
+    _provider = provider
+    _responses.clear()
+
+
+def _get_semaphore() -> asyncio.Semaphore:
+    global _semaphore
+    if _semaphore is None:
+        _semaphore = asyncio.Semaphore(AI_MAX_CONCURRENCY)
+    return _semaphore
+
+
+def build_prompt(request: GenerationRequest) -> str:
+    # On construit la base du contexte
+    base_prompt = f"Pour un(e) {request.target_type} nommé(e) '{request.name}'"
+    if request.category and request.category != "Tous":
+        base_prompt += f" dans la catégorie '{request.category}'"
+    if request.location and request.location != "Toutes les villes":
+        base_prompt += f" situé(e) à {request.location}"
+
+    # On adapte l'instruction finale
+    if (
+        request.description
+        and len(request.description.strip()) > MIN_DESCRIPTION_LENGTH
+    ):
+        # Si une description existe déjà, on demande à l'IA de l'améliorer
+        return f"{base_prompt}, améliore et reformule le texte suivant pour en faire une description commerciale plus attrayante (2-3 phrases) : '{request.description}'. Adopte un ton accueillant et local."
+    # Sinon, on lui demande de créer une description de zéro
+    return f"{base_prompt}, rédige une description commerciale courte (2-3 phrases). Met en avant un bénéfice client clair et adopte un ton accueillant et local."
+
+
+def prompt_key(prompt: str) -> str:
+    """Clé de cache : prompt en forme Unicode NFKC, espaces normalisés."""
+    normalized = " ".join(unicodedata.normalize("NFKC", prompt).split())
+    return hashlib.sha256(normalized.encode()).hexdigest()
+
+
+async def _call_provider(key: str, prompt: str) -> str:
+    async with _get_semaphore():
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        try:
+            text = await get_provider().generate(prompt)
+        finally:
+            metrics.observe("ai.generate", loop.time() - started)
+    _responses[key] = text
+    return text
+
+
+async def generate_text(prompt: str) -> str:
+    key = prompt_key(prompt)
+    cached = _responses.get(key)
+    if cached is not None:
+        metrics.incr("ai.cache_hit")
+        return cached
+
+    task = _inflight.get(key)
+    if task is None:
+        metrics.incr("ai.cache_miss")
+        task = asyncio.create_task(_call_provider(key, prompt))
+        _inflight[key] = task
+        task.add_done_callback(lambda _: _inflight.pop(key, None))
+    else:
+        metrics.incr("ai.coalesced")
+    # shield : un client qui abandonne n'annule pas l'appel partagé
+    return await asyncio.shield(task)
+
+
+async def generate_description(request: GenerationRequest) -> str:
+    return await generate_text(build_prompt(request))
+
+
+async def stream_text(prompt: str) -> AsyncIterator[str]:
+    """
+    Génère le texte de `prompt` morceau par morceau. Si le générateur est
+    fermé avant la fin (client déconnecté), l'appel au fournisseur est
+    abandonné et rien n'est mis en cache.
+    """
+    key = prompt_key(prompt)
+    cached = _responses.get(key)
+    if cached is not None:
+        metrics.incr("ai.cache_hit")
+        yield cached
+        return
+
+    metrics.incr("ai.cache_miss")
+    async with _get_semaphore():
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        first_chunk = True
+        chunks = []
+        stream = get_provider().stream(prompt)
+        try:
+            async for chunk in stream:
+                if first_chunk:
+                    metrics.observe("ai.time_to_first_chunk", loop.time() - started)
+                    first_chunk = False
+                chunks.append(chunk)
+                yield chunk
+        except (asyncio.CancelledError, GeneratorExit):
+            metrics.incr("ai.stream_cancelled")
+            raise
+        finally:
+            # Ferme le flux du fournisseur (et la requête en cours) au plus tôt
+            await stream.aclose()
+            metrics.observe("ai.stream", loop.time() - started)
+    _responses[key] = "".join(chunks)
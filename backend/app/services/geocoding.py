@@ -0,0 +1,217 @@
+"""
+Géocodage des adresses de boutiques via Nominatim (OpenStreetMap).
+
+- Un seul `httpx.AsyncClient` partagé (connexions réutilisées), fermé dans le
+  lifespan de l'application ;
+- un limiteur global espace les appels d'au moins `NOMINATIM_MIN_INTERVAL`
+  secondes (politique d'usage de Nominatim : 1 requête/s) ;
+- les résultats sont mis en cache sous une forme normalisée de la requête :
+  LRU en mémoire devant la collection MongoDB `geocode_cache`. Les marchands
+  saisissent souvent les mêmes villes et quartiers : les lieux déjà connus
+  sont résolus sans appel réseau.
+
+Le géocodage inversé (`reverse_geocode`) est mis en cache par cellule d'une
+grille de `REVERSE_GEOCODE_PRECISION` décimales (3 ≈ 110 m) : des
+coordonnées à quelques mètres près partagent la même adresse. Une entrée
+fraîche est servie telle quelle ; une entrée périmée depuis moins de
+`REVERSE_GEOCODE_STALE` secondes est servie immédiatement et rafraîchie en
+arrière-plan. Les requêtes simultanées sur une même cellule partagent un
+seul appel à Nominatim.
+"""
+
+import asyncio
+import math
+import os
+import re
+import time
+import unicodedata
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+import httpx
+from cachetools import LRUCache
+from dotenv import load_dotenv
+
+from app.core import metrics
+from app.db.database import geocode_cache
+
+load_dotenv()
+
+NOMINATIM_URL = os.getenv(
+    "NOMINATIM_URL", default="https://nominatim.openstreetmap.org"
+)
+NOMINATIM_USER_AGENT = os.getenv("NOMINATIM_USER_AGENT", default="AriminApp/1.0")
+NOMINATIM_MIN_INTERVAL = float(os.getenv("NOMINATIM_MIN_INTERVAL", default=1.0))
+NOMINATIM_TIMEOUT = float(os.getenv("NOMINATIM_TIMEOUT", default=10))
+GEOCODE_LRU_SIZE = int(os.getenv("GEOCODE_LRU_SIZE", default=5000))
+REVERSE_GEOCODE_PRECISION = int(os.getenv("REVERSE_GEOCODE_PRECISION", default=3))
+REVERSE_GEOCODE_TTL = int(os.getenv("REVERSE_GEOCODE_TTL", default=86400))
+REVERSE_GEOCODE_STALE = int(os.getenv("REVERSE_GEOCODE_STALE", default=604800))
+REVERSE_GEOCODE_LRU_SIZE = int(os.getenv("REVERSE_GEOCODE_LRU_SIZE", default=20000))
+
+_client: Optional[httpx.AsyncClient] = None
+_geocodes = LRUCache(maxsize=GEOCODE_LRU_SIZE)
+# Cellule -> (adresse ou None, instant de récupération)
+_addresses = LRUCache(maxsize=REVERSE_GEOCODE_LRU_SIZE)
+# Cellule -> appel à Nominatim en cours
+_inflight: Dict[Tuple[int, int], asyncio.Task] = {}
+
+
+class RateLimiter:
+    """Espace les appels d'au moins `interval` secondes, pour tout le processus."""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._lock = asyncio.Lock()
+        self._next_slot = 0.0
+
+    async def wait(self) -> None:
+        async with self._lock:
+            loop = asyncio.get_running_loop()
+            delay = self._next_slot - loop.time()
+            if delay > 0:
+                metrics.observe("geocoding.rate_limit_wait", delay)
+                await asyncio.sleep(delay)
+            self._next_slot = loop.time() + self.interval
+
+
+_rate_limiter = RateLimiter(NOMINATIM_MIN_INTERVAL)
+
+
+def get_http_client() -> httpx.AsyncClient:
+    global _client
+    if _client is None:
+        _client = httpx.AsyncClient(
+            base_url=NOMINATIM_URL,
+            headers={"User-Agent": NOMINATIM_USER_AGENT},
+            timeout=NOMINATIM_TIMEOUT,
+            limits=httpx.Limits(max_connections=4, max_keepalive_connections=2),
+        )
+    return _client
+
+
+async def close() -> None:
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+async def nominatim_get(path: str, params: dict) -> httpx.Response:
+    """Appel GET à Nominatim, soumis au limiteur de débit global."""
+    await _rate_limiter.wait()
+    metrics.incr("geocoding.upstream_calls")
+    response = await get_http_client().get(path, params=params)
+    response.raise_for_status()
+    return response
+
+
+def normalize_query(location: str) -> str:
+    """« Akpakpa ,  COTONOU » et « akpakpa, cotonou » partagent la même clé."""
+    text = unicodedata.normalize("NFKC", location).casefold()
+    text = re.sub(r"\s*,\s*", ", ", text)
+    return " ".join(text.split()).strip(" ,")
+
+
+async def geocode(location: str) -> Optional[dict]:
+    """
+    Renvoie le point GeoJSON correspondant à `location` (au Bénin), ou `None`
+    si le lieu est inconnu. Les lieux inconnus sont aussi mis en cache ; une
+    erreur de Nominatim, elle, n'est pas mémorisée.
+    """
+    key = normalize_query(location)
+    if not key:
+        return None
+
+    if key in _geocodes:
+        metrics.incr("geocoding.lru_hit")
+        return _geocodes[key]
+
+    cached = await geocode_cache.find_one({"_id": key})
+    if cached is not None:
+        metrics.incr("geocoding.db_hit")
+        _geocodes[key] = cached["geolocation"]
+        return cached["geolocation"]
+
+    metrics.incr("geocoding.miss")
+    response = await nominatim_get(
+        "/search",
+        {"q": location, "format": "json", "limit": 1, "countrycodes": "bj"},
+    )
+    results = response.json()
+    geolocation = None
+    if results:
+        geolocation = {
+            "type": "Point",
+            "coordinates": [float(results[0]["lon"]), float(results[0]["lat"])],
+        }
+
+    _geocodes[key] = geolocation
+    await geocode_cache.update_one(
+        {"_id": key},
+        {"$set": {"geolocation": geolocation, "updated_at": datetime.utcnow()}},
+        upsert=True,
+    )
+    return geolocation
+
+
+def grid_cell(lat: float, lon: float) -> Tuple[int, int]:
+    """Cellule de la grille contenant le point (lat, lon)."""
+    scale = 10**REVERSE_GEOCODE_PRECISION
+    return math.floor(lat * scale), math.floor(lon * scale)
+
+
+async def _fetch_address(cell: Tuple[int, int]) -> Optional[str]:
+    # On interroge le centre de la cellule : le résultat vaut pour toute la
+    # cellule, quel que soit le point demandé en premier
+    scale = 10**REVERSE_GEOCODE_PRECISION
+    response = await nominatim_get(
+        "/reverse",
+        {
+            "lat": (cell[0] + 0.5) / scale,
+            "lon": (cell[1] + 0.5) / scale,
+            "format": "json",
+        },
+    )
+    address = response.json().get("display_name")
+    _addresses[cell] = (address, time.monotonic())
+    return address
+
+
+def _refresh(cell: Tuple[int, int]) -> asyncio.Task:
+    """Appel à Nominatim pour `cell`, partagé avec les appels déjà en cours."""
+    task = _inflight.get(cell)
+    if task is None:
+        task = asyncio.create_task(_fetch_address(cell))
+        _inflight[cell] = task
+        task.add_done_callback(lambda _: _inflight.pop(cell, None))
+    else:
+        metrics.incr("reverse_geocoding.coalesced")
+    return task
+
+
+def _log_refresh_error(task: asyncio.Task) -> None:
+    if not task.cancelled() and task.exception() is not None:
+        print(f"Erreur de rafraîchissement du géocodage inversé: {task.exception()}")
+
+
+async def reverse_geocode(lat: float, lon: float) -> Optional[str]:
+    """Adresse textuelle la plus proche de (lat, lon), ou `None` si inconnue."""
+    cell = grid_cell(lat, lon)
+    entry = _addresses.get(cell)
+    if entry is not None:
+        address, fetched_at = entry
+        age = time.monotonic() - fetched_at
+        if age < REVERSE_GEOCODE_TTL:
+            metrics.incr("reverse_geocoding.hit")
+            return address
+        if age < REVERSE_GEOCODE_TTL + REVERSE_GEOCODE_STALE:
+            # Servie périmée pendant que l'adresse est rafraîchie
+            metrics.incr("reverse_geocoding.stale")
+            if cell not in _inflight:
+                _refresh(cell).add_done_callback(_log_refresh_error)
+            return address
+
+    metrics.incr("reverse_geocoding.miss")
+    # shield : l'annulation d'une requête cliente n'annule pas l'appel partagé
+    return await asyncio.shield(_refresh(cell))
@@ -0,0 +1,228 @@
+"""
+États des commandes et mise à jour atomique du statut des sous-commandes.
+
+Une sous-commande suit la machine à états `SUB_ORDER_TRANSITIONS`. Le statut
+global de la commande en est déduit (`global_status`) :
+- toutes les sous-commandes livrées -> "Livrée" ;
+- au moins une en cours de livraison -> "En cours de livraison" ;
+- toutes annulées -> "Annulée" ;
+- sinon le statut global ne change pas.
+
+`update_sub_order_status` applique la transition et recalcule le statut
+global en une seule mise à jour par pipeline d'agrégation : pas de fenêtre
+de concurrence entre lecture et écriture, et un seul aller-retour.
+"""
+
+from typing import List
+
+from bson import ObjectId
+from fastapi import HTTPException
+from pymongo import ReturnDocument
+
+from app.db.database import orders, users
+from app.services.stats_services import track_status_change
+
+PENDING = "En attente"
+SHIPPING = "En cours de livraison"
+DELIVERED = "Livrée"
+CANCELLED = "Annulée"
+
+ORDER_STATUSES = (PENDING, SHIPPING, DELIVERED, CANCELLED)
+
+# Statuts atteignables depuis chaque statut de sous-commande
+SUB_ORDER_TRANSITIONS = {
+    PENDING: {SHIPPING, DELIVERED, CANCELLED},
+    SHIPPING: {DELIVERED, CANCELLED},
+    DELIVERED: set(),
+    CANCELLED: set(),
+}
+
+
+def allowed_previous_statuses(new_status: str) -> List[str]:
+    """Statuts depuis lesquels `new_status` est atteignable (lui compris)."""
+    return [new_status] + [
+        status
+        for status, targets in SUB_ORDER_TRANSITIONS.items()
+        if new_status in targets
+    ]
+
+
+def sub_order_status(sub_order: dict) -> str:
+    # Les anciennes sous-commandes n'ont pas de `status` (défaut du schéma)
+    return sub_order.get("status", PENDING)
+
+
+def _status_filter(new_status: str) -> dict:
+    allowed = allowed_previous_statuses(new_status)
+    if PENDING in allowed:
+        # `None` couvre aussi les sous-commandes sans champ `status`
+        return {"$in": allowed + [None]}
+    return {"$in": allowed}
+
+
+def _is_target(sub_order: dict, shop_id: ObjectId, new_status: str) -> bool:
+    return sub_order["shop_id"] == shop_id and sub_order_status(
+        sub_order
+    ) in allowed_previous_statuses(new_status)
+
+
+def global_status(sub_statuses: List[str], current: str) -> str:
+    if sub_statuses and all(s == DELIVERED for s in sub_statuses):
+        return DELIVERED
+    if any(s == SHIPPING for s in sub_statuses):
+        return SHIPPING
+    if sub_statuses and all(s == CANCELLED for s in sub_statuses):
+        return CANCELLED
+    return current
+
+
+def _all_statuses_equal(status: str) -> dict:
+    return {
+        "$allElementsTrue": [
+            {
+                "$map": {
+                    "input": "$sub_orders",
+                    "in": {"$eq": [{"$ifNull": ["$$this.status", PENDING]}, status]},
+                }
+            }
+        ]
+    }
+
+
+def _status_update_pipeline(shop_id: ObjectId, new_status: str) -> List[dict]:
+    """
+    Équivalent MongoDB de la transition suivie de `global_status`. Comme
+    l'ancien opérateur positionnel `$`, seule la première sous-commande de
+    la boutique dont le statut autorise la transition est modifiée.
+    """
+    is_target = {
+        "$map": {
+            "input": "$sub_orders",
+            "as": "sub",
+            "in": {
+                "$and": [
+                    {"$eq": ["$$sub.shop_id", shop_id]},
+                    {
+                        "$in": [
+                            {"$ifNull": ["$$sub.status", PENDING]},
+                            allowed_previous_statuses(new_status),
+                        ]
+                    },
+                ]
+            },
+        }
+    }
+    set_sub_order_status = {
+        "$let": {
+            "vars": {"target": {"$indexOfArray": [is_target, True]}},
+            "in": {
+                "$map": {
+                    "input": {"$range": [0, {"$size": "$sub_orders"}]},
+                    "as": "i",
+                    "in": {
+                        "$cond": [
+                            {"$eq": ["$$i", "$$target"]},
+                            {
+                                "$mergeObjects": [
+                                    {"$arrayElemAt": ["$sub_orders", "$$i"]},
+                                    {"status": new_status},
+                                ]
+                            },
+                            {"$arrayElemAt": ["$sub_orders", "$$i"]},
+                        ]
+                    },
+                }
+            },
+        }
+    }
+    recompute_global_status = {
+        "$switch": {
+            "branches": [
+                {"case": _all_statuses_equal(DELIVERED), "then": DELIVERED},
+                {"case": {"$in": [SHIPPING, "$sub_orders.status"]}, "then": SHIPPING},
+                {"case": _all_statuses_equal(CANCELLED), "then": CANCELLED},
+            ],
+            "default": "$status",
+        }
+    }
+    # Deux étapes : la seconde voit les sous-commandes déjà mises à jour
+    return [
+        {"$set": {"sub_orders": set_sub_order_status}},
+        {"$set": {"status": recompute_global_status}},
+    ]
+
+
+async def update_sub_order_status(
+    order_id: ObjectId, shop_id: ObjectId, new_status: str
+) -> dict:
+    """
+    Passe la sous-commande de `shop_id` au statut `new_status` et renvoie la
+    commande mise à jour. Lève 400 (statut inconnu), 404 (commande ou
+    sous-commande introuvable) ou 409 (transition interdite).
+    """
+    if new_status not in ORDER_STATUSES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Statut invalide. Valeurs possibles : {', '.join(ORDER_STATUSES)}.",
+        )
+
+    # La commande d'avant la mise à jour suffit : l'état final s'en déduit
+    previous = await orders.find_one_and_update(
+        {
+            "_id": order_id,
+            "sub_orders": {
+                "$elemMatch": {"shop_id": shop_id, "status": _status_filter(new_status)}
+            },
+        },
+        _status_update_pipeline(shop_id, new_status),
+        return_document=ReturnDocument.BEFORE,
+    )
+    if previous is None:
+        await _raise_update_error(order_id, shop_id, new_status)
+
+    updated = dict(previous)
+    updated["sub_orders"] = list(previous["sub_orders"])
+    target = next(
+        i
+        for i, sub in enumerate(updated["sub_orders"])
+        if _is_target(sub, shop_id, new_status)
+    )
+    updated["sub_orders"][target] = {
+        **updated["sub_orders"][target],
+        "status": new_status,
+    }
+    updated["status"] = global_status(
+        [sub_order_status(sub) for sub in updated["sub_orders"]], previous["status"]
+    )
+    if updated["status"] != previous["status"]:
+        await track_status_change(
+            "orders_pending", PENDING, previous["status"], updated["status"]
+        )
+    return updated
+
+
+async def _raise_update_error(
+    order_id: ObjectId, shop_id: ObjectId, new_status: str
+) -> None:
+    # Chemin d'échec uniquement : on relit la sous-commande pour expliquer le refus
+    order = await orders.find_one(
+        {"_id": order_id, "sub_orders.shop_id": shop_id}, {"sub_orders.$": 1}
+    )
+    if order is None:
+        raise HTTPException(
+            status_code=404,
+            detail="Commande non trouvée ou non autorisée pour cette boutique.",
+        )
+    current = sub_order_status(order["sub_orders"][0])
+    raise HTTPException(
+        status_code=409,
+        detail=f"Transition de statut impossible : '{current}' -> '{new_status}'.",
+    )
+
+
+async def with_customer(order: dict) -> dict:
+    """Ajoute le client à la commande (sans son mot de passe)."""
+    customer = await users.find_one({"_id": order["user_id"]}, {"password": 0})
+    if customer:
+        order["customer"] = customer
+    return order
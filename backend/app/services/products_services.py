@@ -0,0 +1,108 @@
+"""
+Champs dénormalisés des produits.
+
+Chaque produit porte :
+- `is_visible` : vrai si sa boutique est publiée ET si le marchand est actif ;
+- `shop` : un instantané de sa boutique (nom, téléphone, catégorie, ville) ;
+- `seller` : le prénom du marchand.
+
+Les lectures publiques deviennent ainsi un simple `find` indexé sur
+`is_visible`, sans les jointures products → shops → users. Ces champs doivent
+être resynchronisés à chaque écriture qui les affecte (publication, mise à
+jour de boutique, changement de statut ou de nom du marchand) ; ces mêmes
+fonctions incrémentent les compteurs de version du catalogue public
+(services/versions_services.py).
+
+Migration / réparation complète (depuis le dossier `backend/`) :
+
+    python -m app.services.products_services
+"""
+
+import asyncio
+from typing import Optional
+
+from bson import ObjectId
+
+from app.db.database import products, shops, users
+from app.services.versions_services import bump_shop_catalog
+
+
+def shop_snapshot(shop: dict) -> dict:
+    """Instantané de la boutique embarqué dans chaque produit."""
+    return {
+        "_id": shop["_id"],
+        "name": shop.get("name"),
+        "contact_phone": shop.get("contact_phone"),
+        "category": shop.get("category"),
+        "location": shop.get("location"),
+    }
+
+
+def denormalized_fields(shop: dict, owner: Optional[dict]) -> dict:
+    """Champs à poser sur les produits d'une boutique."""
+    return {
+        "is_visible": bool(
+            shop.get("is_published") and owner and owner.get("is_active") is True
+        ),
+        "shop": shop_snapshot(shop),
+        "seller": owner.get("first_name") if owner else None,
+    }
+
+
+async def is_shop_visible(shop_id: ObjectId) -> bool:
+    """Vrai si la boutique est publiée ET si son propriétaire est actif."""
+    shop = await shops.find_one({"_id": shop_id, "is_published": True}, {"owner_id": 1})
+    if not shop:
+        return False
+    owner = await users.find_one({"_id": shop["owner_id"]}, {"is_active": 1})
+    return bool(owner and owner.get("is_active") is True)
+
+
+async def sync_shop_products(shop_id: ObjectId) -> None:
+    """Resynchronise les produits d'une boutique après une écriture sur celle-ci."""
+    shop = await shops.find_one({"_id": shop_id})
+    if not shop:
+        return
+    owner = await users.find_one({"_id": shop["owner_id"]})
+    await products.update_many(
+        {"shop_id": shop_id}, {"$set": denormalized_fields(shop, owner)}
+    )
+    await bump_shop_catalog(shop_id)
+
+
+async def sync_owner_products(owner_id: ObjectId) -> None:
+    """Resynchronise les produits de toutes les boutiques d'un marchand."""
+    owner = await users.find_one({"_id": owner_id})
+    async for shop in shops.find({"owner_id": owner_id}):
+        await products.update_many(
+            {"shop_id": shop["_id"]}, {"$set": denormalized_fields(shop, owner)}
+        )
+        await bump_shop_catalog(shop["_id"])
+
+
+async def sync_unsynced_products() -> None:
+    """
+    Synchronise les boutiques dont des produits n'ont pas encore les champs
+    dénormalisés (produits antérieurs à leur introduction). Appelé au démarrage.
+    """
+    shop_ids = await products.distinct("shop_id", {"is_visible": {"$exists": False}})
+    for shop_id in shop_ids:
+        await sync_shop_products(shop_id)
+
+
+async def sync_all_products() -> int:
+    """Recalcule les champs dénormalisés de tous les produits."""
+    count = 0
+    async for shop in shops.find({}):
+        owner = await users.find_one({"_id": shop["owner_id"]})
+        result = await products.update_many(
+            {"shop_id": shop["_id"]}, {"$set": denormalized_fields(shop, owner)}
+        )
+        await bump_shop_catalog(shop["_id"])
+        count += result.modified_count
+    return count
+
+
+if __name__ == "__main__":
+    modified = asyncio.run(sync_all_products())
+    print(f"{modified} produits resynchronisés.")
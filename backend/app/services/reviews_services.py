@@ -0,0 +1,76 @@
+"""
+Agrégats de notes des boutiques.
+
+Chaque boutique porte `rating_count`, `rating_sum` et un histogramme
+`rating_histogram` ({"1": n, ..., "5": n}), maintenus par `$inc` à la création
+et à la suppression d'un avis : les listes de boutiques affichent la note
+moyenne sans relire les avis.
+
+Recalcul complet (réparation) depuis le dossier `backend/` :
+
+    python -m app.services.reviews_services
+"""
+
+import asyncio
+
+from bson import ObjectId
+
+from app.db.database import reviews, shops
+from app.services.versions_services import SHOPS, bump, shop_key
+
+RATING_VALUES = range(1, 6)
+
+
+def empty_rating_fields() -> dict:
+    return {
+        "rating_count": 0,
+        "rating_sum": 0,
+        "rating_histogram": {str(value): 0 for value in RATING_VALUES},
+    }
+
+
+async def apply_rating(shop_id: ObjectId, rating: int, delta: int = 1) -> None:
+    """Ajoute (`delta=1`) ou retire (`delta=-1`) une note des agrégats de la boutique."""
+    await shops.update_one(
+        {"_id": shop_id},
+        {
+            "$inc": {
+                "rating_count": delta,
+                "rating_sum": delta * rating,
+                f"rating_histogram.{rating}": delta,
+            }
+        },
+    )
+
+
+async def recompute_shop_ratings() -> int:
+    """Recalcule les agrégats de toutes les boutiques à partir des avis."""
+    pipeline = [
+        {
+            "$group": {
+                "_id": {"shop_id": "$shop_id", "rating": "$rating"},
+                "n": {"$sum": 1},
+            }
+        }
+    ]
+    totals = {}
+    async for row in reviews.aggregate(pipeline):
+        shop_id, rating = row["_id"]["shop_id"], row["_id"]["rating"]
+        fields = totals.setdefault(shop_id, empty_rating_fields())
+        fields["rating_count"] += row["n"]
+        fields["rating_sum"] += row["n"] * rating
+        fields["rating_histogram"][str(rating)] = row["n"]
+
+    # Les boutiques sans avis sont remises à zéro
+    await shops.update_many(
+        {"_id": {"$nin": list(totals)}}, {"$set": empty_rating_fields()}
+    )
+    for shop_id, fields in totals.items():
+        await shops.update_one({"_id": shop_id}, {"$set": fields})
+    await bump(SHOPS, *(shop_key(shop_id) for shop_id in totals))
+    return len(totals)
+
+
+if __name__ == "__main__":
+    count = asyncio.run(recompute_shop_ratings())
+    print(f"Notes recalculées pour {count} boutiques.")
@@ -0,0 +1,253 @@
+"""
+Moteur de recherche du catalogue (boutiques + produits).
+
+S'appuie sur les index texte pondérés déclarés dans `app/db/indexes.py`
+(`shops_text`, `products_text`) : les résultats sont classés par score de
+pertinence MongoDB (`textScore`) au lieu d'un `$regex` non ancré qui parcourt
+toute la collection. Le contrat de réponse reste une liste d'éléments
+`{"type": "product" | "shop", "data": {...}}`.
+"""
+
+import re
+from typing import List, Optional
+
+from app.db.database import shops, products
+
+# Rayon de la recherche par proximité (en mètres)
+GEO_MAX_DISTANCE = 50000
+# Nombre maximum de boutiques candidates de la recherche par proximité : les
+# plus proches (`$geoNear` trie par distance), les autres sont ignorées
+MAX_CANDIDATE_SHOPS = 500
+# Dernière page accessible : chaque page lit `page * limit` éléments
+MAX_SEARCH_PAGE = 50
+
+_ACTIVE_OWNER_STAGES = [
+    {
+        "$lookup": {
+            "from": "users",
+            "localField": "owner_id",
+            "foreignField": "_id",
+            "as": "owner_details",
+        }
+    },
+    {"$unwind": "$owner_details"},
+    {"$match": {"owner_details.is_active": True}},
+]
+
+
+def build_shop_filter(
+    category: Optional[str] = None, location: Optional[str] = None
+) -> dict:
+    """Filtre commun des boutiques visibles (catégorie, ville)."""
+    shop_filter = {"is_published": True}
+    if category and category != "Tous":
+        shop_filter["category"] = category
+    if location and location != "Toutes les villes":
+        shop_filter["location"] = {"$regex": re.escape(location), "$options": "i"}
+    return shop_filter
+
+
+def build_price_filter(price_range: Optional[str]) -> dict:
+    """Traduit le paramètre `priceRange` ("min-max" ou "100000+") en filtre."""
+    if not price_range or price_range == "Tous les prix":
+        return {}
+    if price_range == "100000+":
+        return {"price": {"$gt": 100000}}
+    try:
+        min_price, max_price = map(int, price_range.split("-"))
+    except ValueError:
+        return {}
+    return {"price": {"$gte": min_price, "$lte": max_price}}
+
+
+async def _nearby_shops(shop_filter: dict, lat: float, lon: float) -> dict:
+    """Boutiques visibles dans le rayon, indexées par _id, avec leur distance."""
+    pipeline = [
+        {
+            "$geoNear": {
+                "near": {"type": "Point", "coordinates": [lon, lat]},
+                "distanceField": "distance",
+                "maxDistance": GEO_MAX_DISTANCE,
+                "query": shop_filter,
+                "spherical": True,
+            }
+        },
+        *_ACTIVE_OWNER_STAGES,
+        {"$limit": MAX_CANDIDATE_SHOPS},
+        {"$project": {"name": 1, "images": 1, "distance": 1}},
+    ]
+    return {shop["_id"]: shop async for shop in shops.aggregate(pipeline)}
+
+
+async def _search_shops(
+    q: str, shop_filter: dict, candidates: Optional[dict], limit: int
+) -> List[dict]:
+    match = {"$text": {"$search": q}, **shop_filter}
+    if candidates is not None:
+        match["_id"] = {"$in": list(candidates)}
+    pipeline = [
+        {"$match": match},
+        {"$addFields": {"score": {"$meta": "textScore"}}},
+        {"$sort": {"score": -1, "_id": 1}},
+        *_ACTIVE_OWNER_STAGES,
+        {"$limit": limit},
+        {"$project": {"name": 1, "images": 1, "score": 1}},
+    ]
+    found = await shops.aggregate(pipeline).to_list(length=limit)
+    for shop in found:
+        if candidates is not None:
+            shop["distance"] = candidates[shop["_id"]].get("distance")
+    return found
+
+
+async def _search_products(
+    q: Optional[str],
+    price_filter: dict,
+    shop_filter: dict,
+    candidates: Optional[dict],
+    limit: int,
+) -> List[dict]:
+    # `is_visible` et l'instantané `shop` sont dénormalisés sur chaque produit
+    # (services/products_services.py) : aucune jointure n'est nécessaire.
+    match = {"is_visible": True, **price_filter}
+    if q:
+        match["$text"] = {"$search": q}
+    if candidates is not None:
+        match["shop_id"] = {"$in": list(candidates)}
+    else:
+        for field in ("category", "location"):
+            if field in shop_filter:
+                match[f"shop.{field}"] = shop_filter[field]
+
+    pipeline = [{"$match": match}]
+    if q:
+        pipeline += [
+            {"$addFields": {"score": {"$meta": "textScore"}}},
+            {"$sort": {"score": -1, "_id": 1}},
+        ]
+    elif candidates is not None:
+        # `candidates` suit l'ordre de `$geoNear` : le rang de la boutique
+        # classe les produits de la plus proche à la plus éloignée
+        pipeline += [
+            {
+                "$addFields": {
+                    "distance_rank": {"$indexOfArray": [list(candidates), "$shop_id"]}
+                }
+            },
+            {"$sort": {"distance_rank": 1, "_id": -1}},
+        ]
+    else:
+        pipeline.append({"$sort": {"_id": -1}})
+    pipeline += [
+        {"$limit": limit},
+        {
+            "$project": {
+                "name": 1,
+                "images": 1,
+                "shop_id": 1,
+                "shop_name": "$shop.name",
+                "score": 1,
+            }
+        },
+    ]
+
+    found = await products.aggregate(pipeline).to_list(length=limit)
+    if candidates is not None:
+        for product in found:
+            product["distance"] = candidates.get(product["shop_id"], {}).get("distance")
+    return found
+
+
+def _normalize_scores(found: List[dict]) -> List[dict]:
+    """
+    Ramène les `textScore` d'une collection entre 0 et 1 (meilleur = 1).
+    Les index texte des boutiques et des produits n'ont pas les mêmes poids :
+    leurs scores bruts ne sont pas comparables entre eux.
+    """
+    top = max((item.get("score") or 0 for item in found), default=0)
+    if top > 0:
+        for item in found:
+            item["score"] = (item.get("score") or 0) / top
+    return found
+
+
+def _product_result(product: dict) -> dict:
+    return {
+        "type": "product",
+        "data": {
+            "id": str(product["_id"]),
+            "name": product["name"],
+            "images": product.get("images", []),
+            "shop_id": str(product["shop_id"]),
+            "shop_name": product.get("shop_name"),
+            "distance": product.get("distance"),
+            "score": product.get("score"),
+        },
+    }
+
+
+def _shop_result(shop: dict) -> dict:
+    return {
+        "type": "shop",
+        "data": {
+            "id": str(shop["_id"]),
+            "name": shop["name"],
+            "images": shop.get("images", []),
+            "distance": shop.get("distance"),
+            "score": shop.get("score"),
+        },
+    }
+
+
+async def search_catalog(
+    q: Optional[str] = None,
+    category: Optional[str] = None,
+    location: Optional[str] = None,
+    price_range: Optional[str] = None,
+    lat: Optional[float] = None,
+    lon: Optional[float] = None,
+    page: int = 1,
+    limit: int = 20,
+) -> List[dict]:
+    """
+    Recherche unifiée paginée.
+
+    - Avec `q` : boutiques et produits sont classés ensemble par score de
+      pertinence décroissant, normalisé dans chaque collection.
+    - Sans `q` : seuls les produits des boutiques correspondant aux filtres
+      sont renvoyés (comportement historique), du plus récent au plus ancien
+      ou, avec `lat`/`lon`, de la boutique la plus proche à la plus éloignée.
+    - Avec `lat`/`lon` : la recherche est restreinte aux
+      `MAX_CANDIDATE_SHOPS` boutiques les plus proches situées à moins de
+      `GEO_MAX_DISTANCE` mètres et chaque résultat porte sa distance.
+    """
+    shop_filter = build_shop_filter(category, location)
+    price_filter = build_price_filter(price_range)
+    window = page * limit
+    skip = (page - 1) * limit
+
+    candidates = None
+    if lat is not None and lon is not None:
+        candidates = await _nearby_shops(shop_filter, lat, lon)
+        if not candidates:
+            return []
+
+    found_products = await _search_products(
+        q, price_filter, shop_filter, candidates, window
+    )
+    if q:
+        found_products = _normalize_scores(found_products)
+    results = [_product_result(p) for p in found_products]
+
+    if q:
+        # Un filtre de prix ne concerne que les produits
+        if not price_filter:
+            found_shops = await _search_shops(q, shop_filter, candidates, window)
+            results += [_shop_result(s) for s in _normalize_scores(found_shops)]
+        results.sort(key=lambda item: item["data"]["score"] or 0, reverse=True)
+
+    for item in results:
+        if item["data"]["score"] is not None:
+            item["data"]["score"] = round(item["data"]["score"], 3)
+
+    return results[skip : skip + limit]
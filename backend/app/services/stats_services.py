@@ -0,0 +1,109 @@
+"""
+Compteurs de la plateforme pour les statistiques d'administration.
+
+- Les totaux par collection utilisent `estimated_document_count` (lecture des
+  métadonnées, sans parcours) et sont lus en parallèle.
+- Les compteurs filtrés (commandes "En attente", suggestions "nouveau") sont
+  matérialisés dans un document de la collection `stats`, mis à jour par
+  `$inc` lors des écritures concernées, et recalculés au démarrage s'il
+  n'existe pas encore.
+- Un cache TTL évite de relire la base à chaque rafraîchissement du tableau de
+  bord ; il est vidé à chaque incrément.
+"""
+
+import asyncio
+import os
+
+from cachetools import TTLCache
+from dotenv import load_dotenv
+
+from app.db.database import orders, products, shops, stats, suggestions, users
+
+load_dotenv()
+
+STATS_CACHE_TTL = int(os.getenv("STATS_CACHE_TTL", default=30))
+COUNTERS_ID = "platform"
+
+# Champs du document de compteurs et filtre exact correspondant
+COUNTERS = {
+    "orders_pending": (orders, {"status": "En attente"}),
+    "suggestions_new": (suggestions, {"status": "nouveau"}),
+}
+
+_cache = TTLCache(maxsize=16, ttl=STATS_CACHE_TTL)
+
+
+async def increment(field: str, delta: int = 1) -> None:
+    """Met à jour un compteur matérialisé après une écriture."""
+    if delta:
+        await stats.update_one(
+            {"_id": COUNTERS_ID}, {"$inc": {field: delta}}, upsert=True
+        )
+        _cache.clear()
+
+
+async def track_status_change(field: str, tracked: str, old: str, new: str) -> None:
+    """Ajuste le compteur `field` quand un statut entre ou sort de `tracked`."""
+    await increment(field, int(new == tracked) - int(old == tracked))
+
+
+async def recompute_counters() -> dict:
+    """Recalcule exactement les compteurs filtrés (réparation)."""
+    names = list(COUNTERS)
+    values = await asyncio.gather(
+        *(COUNTERS[name][0].count_documents(COUNTERS[name][1]) for name in names)
+    )
+    counters = dict(zip(names, values))
+    await stats.update_one({"_id": COUNTERS_ID}, {"$set": counters}, upsert=True)
+    _cache.clear()
+    return counters
+
+
+async def ensure_counters() -> None:
+    """Initialise le document de compteurs s'il n'existe pas (démarrage)."""
+    if not await stats.find_one({"_id": COUNTERS_ID}, {"_id": 1}):
+        await recompute_counters()
+
+
+async def _counters() -> dict:
+    document = await stats.find_one({"_id": COUNTERS_ID}) or {}
+    return {name: max(document.get(name, 0), 0) for name in COUNTERS}
+
+
+async def get_platform_counts() -> dict:
+    if "platform" not in _cache:
+        user_count, shop_count, product_count, order_count, counters = (
+            await asyncio.gather(
+                users.estimated_document_count(),
+                shops.estimated_document_count(),
+                products.estimated_document_count(),
+                orders.estimated_document_count(),
+                _counters(),
+            )
+        )
+        _cache["platform"] = {
+            "users": user_count,
+            "shops": shop_count,
+            "products": product_count,
+            "orders": order_count,
+            "suggestions": counters["suggestions_new"],
+        }
+    return _cache["platform"]
+
+
+async def get_order_counts() -> dict:
+    if "orders" not in _cache:
+        total, counters = await asyncio.gather(
+            orders.estimated_document_count(), _counters()
+        )
+        _cache["orders"] = {"total": total, "pending": counters["orders_pending"]}
+    return _cache["orders"]
+
+
+async def get_suggestion_counts() -> dict:
+    if "suggestions" not in _cache:
+        total, counters = await asyncio.gather(
+            suggestions.estimated_document_count(), _counters()
+        )
+        _cache["suggestions"] = {"total": total, "new": counters["suggestions_new"]}
+    return _cache["suggestions"]
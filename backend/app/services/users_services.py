@@ -1,15 +1,9 @@
 from typing import Optional
 from fastapi import HTTPException
-from passlib.context import CryptContext
+from app.core.passwords import hash_password
 from app.schemas.users import UserCreate
 from app.db.database import users
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
-
-def hash_password(password: str) -> str:
-    return pwd_context.hash(password)
-
 
 async def create_user(user: UserCreate) -> dict:
     # Vérifier si l'email est déjà utilisé
@@ -20,7 +14,7 @@ async def create_user(user: UserCreate) -> dict:
     # Préparer le document utilisateur
     user_dict = user.dict()
     user_dict["role"] = user.role  # On prend le rôle envoyé par le frontend
-    user_dict["password"] = hash_password(user.password)
+    user_dict["password"] = await hash_password(user.password)
 
     # Insérer en base
     new_user = await users.insert_one(user_dict)
@@ -0,0 +1,105 @@
+"""
+Compteurs de version des données publiques du catalogue.
+
+Chaque entité lue publiquement a un compteur dans la collection `versions`
+(`_id` = clé, `version` = entier) :
+- `shops` / `products` : les listes publiques de boutiques et de produits ;
+- `shop:<id>` : une boutique (publication, contenu, note moyenne) ;
+- `shop_products:<id>` : les produits publics d'une boutique ;
+- `product:<id>` : un produit ;
+- `reviews:<id>` : les avis d'une boutique.
+
+Toute écriture qui change ce qu'une lecture publique renverrait incrémente
+les clés concernées, APRÈS l'écriture. Les ETag des réponses publiques
+(`app/utils/http_cache.py`) sont calculés à partir de ces compteurs : une
+requête conditionnelle est tranchée en lisant quelques compteurs, sans
+relancer la requête ou l'agrégation de la route. Les mêmes clés servent de
+tags au cache des réponses (`app/core/cache.py`) : `bump` les invalide.
+
+Les changements au niveau de la boutique ou du marchand passent par
+`sync_shop_products` / `sync_owner_products` (services/products_services.py),
+qui appellent `bump_shop_catalog`.
+"""
+
+from typing import Dict, Iterable, Optional
+
+from bson import ObjectId
+from pymongo import UpdateOne
+
+from app.core import cache
+from app.db.database import products, versions
+
+SHOPS = "shops"
+PRODUCTS = "products"
+
+
+def shop_key(shop_id) -> str:
+    return f"shop:{shop_id}"
+
+
+def shop_products_key(shop_id) -> str:
+    return f"shop_products:{shop_id}"
+
+
+def product_key(product_id) -> str:
+    return f"product:{product_id}"
+
+
+def reviews_key(shop_id) -> str:
+    return f"reviews:{shop_id}"
+
+
+async def bump(*keys: str) -> None:
+    """Incrémente les compteurs `keys` (créés à 1 s'ils n'existent pas)."""
+    if not keys:
+        return
+    await versions.bulk_write(
+        [
+            UpdateOne({"_id": key}, {"$inc": {"version": 1}}, upsert=True)
+            for key in dict.fromkeys(keys)
+        ],
+        ordered=False,
+    )
+    await cache.invalidate(*keys)
+
+
+async def get_versions(*keys: str) -> Dict[str, int]:
+    """Compteurs de `keys` en une requête (0 pour une clé jamais incrémentée)."""
+    found = {
+        doc["_id"]: doc["version"]
+        async for doc in versions.find({"_id": {"$in": list(keys)}})
+    }
+    return {key: found.get(key, 0) for key in keys}
+
+
+async def bump_product(shop_id: ObjectId, *product_ids: ObjectId) -> None:
+    """Après la création, la modification ou la suppression de produits."""
+    await bump(
+        PRODUCTS,
+        shop_products_key(shop_id),
+        *(product_key(product_id) for product_id in product_ids),
+    )
+
+
+async def bump_shop_catalog(
+    shop_id: ObjectId, product_ids: Optional[Iterable[ObjectId]] = None
+) -> None:
+    """
+    Après une écriture sur la boutique elle-même : sa fiche, ses produits
+    (qui embarquent un instantané de la boutique) et les listes publiques.
+    `product_ids` est à fournir quand les produits viennent d'être supprimés.
+    """
+    if product_ids is None:
+        product_ids = await products.distinct("_id", {"shop_id": shop_id})
+    await bump(
+        SHOPS,
+        shop_key(shop_id),
+        PRODUCTS,
+        shop_products_key(shop_id),
+        *(product_key(product_id) for product_id in product_ids),
+    )
+
+
+async def bump_reviews(shop_id: ObjectId) -> None:
+    """Après l'ajout ou la suppression d'un avis (la note de la boutique change)."""
+    await bump(reviews_key(shop_id), shop_key(shop_id), SHOPS)
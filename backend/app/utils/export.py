@@ -0,0 +1,185 @@
+"""
+Export en flux (NDJSON ou CSV) des collections pour l'administration.
+
+Les documents sont lus directement depuis un curseur Motor par lots de
+`EXPORT_BATCH_SIZE` et sérialisés ligne par ligne : la mémoire consommée reste
+constante quelle que soit la taille de la collection exportée.
+"""
+
+import csv
+import io
+import json
+from datetime import datetime
+from typing import AsyncIterator, Optional
+
+from bson import ObjectId
+from fastapi import HTTPException
+
+from app.db.database import orders, products, shops, users
+
+EXPORT_BATCH_SIZE = 1000
+# Nombre de lignes regroupées par morceau envoyé au client
+EXPORT_CHUNK_LINES = 500
+
+# Colonnes CSV (et champs projetés) par collection exportable
+EXPORT_COLLECTIONS = {
+    "users": {
+        "collection": users,
+        "fields": [
+            "_id",
+            "first_name",
+            "email",
+            "role",
+            "phone",
+            "location",
+            "is_active",
+        ],
+    },
+    "shops": {
+        "collection": shops,
+        "fields": [
+            "_id",
+            "name",
+            "category",
+            "location",
+            "owner_id",
+            "contact_phone",
+            "is_published",
+            "images",
+        ],
+    },
+    "products": {
+        "collection": products,
+        "fields": [
+            "_id",
+            "name",
+            "price",
+            "shop_id",
+            "is_visible",
+            "description",
+            "images",
+        ],
+    },
+    "orders": {
+        "collection": orders,
+        "fields": [
+            "_id",
+            "user_id",
+            "created_at",
+            "status",
+            "total_price",
+            "shipping_address",
+            "contact_phone",
+            "is_archived",
+            "sub_orders",
+        ],
+    },
+}
+
+
+def _json_default(value):
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Type non sérialisable : {type(value).__name__}")
+
+
+def build_export_filter(
+    collection_name: str,
+    role: Optional[str] = None,
+    status: Optional[str] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+) -> dict:
+    """
+    Filtre Mongo de l'export.
+    - `role` : utilisateurs uniquement ;
+    - `status` : "active"/"suspended" (utilisateurs), "published"/"unpublished"
+      (boutiques), "visible"/"hidden" (produits), statut de commande (commandes) ;
+    - `date_from`/`date_to` : date de création, déduite de l'`_id`.
+    """
+    query = {}
+    if role:
+        if collection_name != "users":
+            raise HTTPException(
+                status_code=400,
+                detail="Le filtre 'role' ne concerne que les utilisateurs.",
+            )
+        query["role"] = role
+
+    if status:
+        flags = {
+            "users": ("is_active", "active", "suspended"),
+            "shops": ("is_published", "published", "unpublished"),
+            "products": ("is_visible", "visible", "hidden"),
+        }
+        if collection_name == "orders":
+            query["status"] = status
+        else:
+            field, true_value, false_value = flags[collection_name]
+            if status not in (true_value, false_value):
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Statut invalide : '{true_value}' ou '{false_value}' attendu.",
+                )
+            query[field] = status == true_value
+
+    # L'ObjectId encode sa date de création : le filtre utilise l'index _id
+    id_range = {}
+    if date_from:
+        id_range["$gte"] = ObjectId.from_datetime(date_from)
+    if date_to:
+        id_range["$lt"] = ObjectId.from_datetime(date_to)
+    if id_range:
+        query["_id"] = id_range
+    return query
+
+
+async def _documents(collection_name: str, query: dict) -> AsyncIterator[dict]:
+    spec = EXPORT_COLLECTIONS[collection_name]
+    projection = {field: 1 for field in spec["fields"]}
+    cursor = (
+        spec["collection"]
+        .find(query, projection)
+        .sort("_id", 1)
+        .batch_size(EXPORT_BATCH_SIZE)
+    )
+    async for document in cursor:
+        yield document
+
+
+async def stream_ndjson(collection_name: str, query: dict) -> AsyncIterator[str]:
+    lines = []
+    async for document in _documents(collection_name, query):
+        lines.append(json.dumps(document, default=_json_default, ensure_ascii=False))
+        if len(lines) >= EXPORT_CHUNK_LINES:
+            yield "\n".join(lines) + "\n"
+            lines = []
+    if lines:
+        yield "\n".join(lines) + "\n"
+
+
+async def stream_csv(collection_name: str, query: dict) -> AsyncIterator[str]:
+    fields = EXPORT_COLLECTIONS[collection_name]["fields"]
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(fields)
+    rows = 0
+    async for document in _documents(collection_name, query):
+        row = []
+        for field in fields:
+            value = document.get(field)
+            if isinstance(value, (list, dict)):
+                value = json.dumps(value, default=_json_default, ensure_ascii=False)
+            elif isinstance(value, (ObjectId, datetime)):
+                value = _json_default(value)
+            row.append("" if value is None else value)
+        writer.writerow(row)
+        rows += 1
+        if rows % EXPORT_CHUNK_LINES == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
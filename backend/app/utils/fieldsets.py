@@ -0,0 +1,40 @@
+"""
+Profils de champs des routes de liste (paramètre `fields=`).
+
+Un profil associe un schéma de réponse à la projection MongoDB qui ne lit
+que ses champs : une vue « carte » (`card`) ne transfère ni ne décode les
+descriptions et n'embarque que la première image, là où `detail` renvoie le
+document complet. Les profils de chaque entité sont définis à côté de ses
+schémas (`PRODUCT_FIELDSETS` dans `app/schemas/product.py`,
+`SHOP_FIELDSETS` dans `app/schemas/shop.py`).
+
+    fieldset: Fieldset = Depends(fields_param(PRODUCT_FIELDSETS))
+    ...
+    products.find(query, fieldset.projection)
+    return model_response(List[fieldset.model], product_list, response)
+"""
+
+from typing import Any, Dict, NamedTuple, Optional
+
+from fastapi import Query
+
+
+class Fieldset(NamedTuple):
+    model: Any
+    # `None` : document complet
+    projection: Optional[dict] = None
+
+
+def fields_param(profiles: Dict[str, Fieldset], default: str = "detail"):
+    names = "|".join(profiles)
+
+    def dependency(
+        fields: str = Query(
+            default,
+            pattern=f"^({names})$",
+            description=f"Profil de champs : {', '.join(profiles)}",
+        ),
+    ) -> Fieldset:
+        return profiles[fields]
+
+    return dependency
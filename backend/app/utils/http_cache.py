@@ -0,0 +1,211 @@
+"""
+Cache HTTP des lectures publiques : ETag et `Cache-Control`.
+
+L'ETag (fort) d'une réponse est une empreinte des compteurs de version des
+entités qu'elle contient (`app/services/versions_services.py`), du chemin et
+de la query string. Il change donc à chaque écriture sur ces entités et
+seulement dans ce cas. Usage dans une route :
+
+    not_modified = await conditional_get(request, response, shop_key(shop_id))
+    if not_modified:
+        return not_modified
+    ...
+    return model_response(ShopWithContact, shop, response)
+
+Si le client renvoie l'ETag courant (`If-None-Match`), la route répond 304
+sans exécuter sa requête ; sinon les en-têtes `ETag` et `Cache-Control`
+sont posés sur `response`. `Cache-Control` autorise les navigateurs et un
+CDN à servir la réponse `PUBLIC_CACHE_MAX_AGE` secondes, puis à la servir
+périmée jusqu'à `PUBLIC_CACHE_STALE_WHILE_REVALIDATE` secondes de plus
+pendant qu'ils la revalident.
+
+`cached_response` sert ensuite le corps depuis le cache des réponses
+(`app/core/cache.py`) ou, à défaut, le calcule avec la fonction `load` de la
+route et l'y enregistre `PUBLIC_CACHE_TTL` secondes. La clé contient
+l'ETag calculé par `conditional_get` : une écriture faite par un autre
+worker change les compteurs de version, donc la clé, et l'ancien corps
+n'est plus jamais servi sous le nouvel ETag. Les clés de version servent
+en plus de tags pour libérer tout de suite les entrées périmées locales. Les 404 sont aussi mis
+en cache (`PUBLIC_CACHE_NEGATIVE_TTL` secondes) : une boutique dépubliée ou
+un lien mort très partagé ne relance pas la requête à chaque visite. Les
+requêtes identiques qui arrivent ensemble pendant un échec de cache (lien
+viral) partagent un seul calcul.
+"""
+
+import asyncio
+import hashlib
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+import orjson
+from dotenv import load_dotenv
+from fastapi import HTTPException, Request, Response
+
+from app.core import cache, metrics
+from app.services.versions_services import get_versions
+from app.utils.responses import model_response
+
+load_dotenv()
+
+PUBLIC_CACHE_MAX_AGE = int(os.getenv("PUBLIC_CACHE_MAX_AGE", default=30))
+PUBLIC_CACHE_STALE_WHILE_REVALIDATE = int(
+    os.getenv("PUBLIC_CACHE_STALE_WHILE_REVALIDATE", default=300)
+)
+PUBLIC_CACHE_TTL = int(os.getenv("PUBLIC_CACHE_TTL", default=300))
+PUBLIC_CACHE_NEGATIVE_TTL = int(os.getenv("PUBLIC_CACHE_NEGATIVE_TTL", default=30))
+PUBLIC_LOAD_TIMEOUT = float(os.getenv("PUBLIC_LOAD_TIMEOUT", default=10))
+
+CACHE_CONTROL = (
+    f"public, max-age={PUBLIC_CACHE_MAX_AGE}, "
+    f"stale-while-revalidate={PUBLIC_CACHE_STALE_WHILE_REVALIDATE}"
+)
+# En-têtes propres à chaque requête, jamais enregistrés dans le cache
+_UNCACHED_HEADERS = {"etag", "cache-control"}
+# Clé de cache -> calcul de la réponse en cours
+_inflight: Dict[str, asyncio.Task] = {}
+
+
+def compute_etag(request: Request, versions: dict) -> str:
+    digest = hashlib.sha1()
+    digest.update(request.url.path.encode())
+    digest.update(b"?" + request.url.query.encode())
+    for key in sorted(versions):
+        digest.update(f"\n{key}={versions[key]}".encode())
+    return f'"{digest.hexdigest()}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Comparaison faible de `If-None-Match` (RFC 9110, section 13.1.2)."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = (tag.strip() for tag in if_none_match.split(","))
+    return etag in (tag[2:] if tag.startswith("W/") else tag for tag in candidates)
+
+
+async def conditional_get(
+    request: Request, response: Response, *keys: str
+) -> Optional[Response]:
+    """
+    Réponse 304 si le client a déjà la version courante des entités `keys`,
+    sinon `None` (et les en-têtes de cache sont posés sur `response`).
+    """
+    etag = compute_etag(request, await get_versions(*keys))
+    # Repris par `cached_response` dans la clé de cache
+    request.state.etag = etag
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        metrics.incr("http_cache.not_modified")
+        return Response(status_code=304, headers=headers)
+    metrics.incr("http_cache.full_response")
+    response.headers.update(headers)
+    return None
+
+
+def _encode_entry(status_code: int, headers: Dict[str, str], body: bytes) -> bytes:
+    # orjson n'émet jamais de saut de ligne brut : il sépare l'en-tête du corps
+    return orjson.dumps([status_code, headers]) + b"\n" + body
+
+
+def _decode_entry(entry: bytes) -> Tuple[int, Dict[str, str], bytes]:
+    meta, body = entry.split(b"\n", 1)
+    status_code, headers = orjson.loads(meta)
+    return status_code, headers, body
+
+
+def _entry_response(entry: bytes, response: Response) -> Response:
+    status_code, headers, body = _decode_entry(entry)
+    if status_code == 404:
+        raise HTTPException(status_code=404, detail=orjson.loads(body))
+    return Response(
+        content=body,
+        media_type="application/json",
+        headers={**headers, **response.headers},
+    )
+
+
+async def _load_entry(
+    key: str,
+    response: Response,
+    model_type: Any,
+    load: Callable[[], Awaitable[Any]],
+    tags: Tuple[str, ...],
+) -> bytes:
+    """Exécute `load`, sérialise son résultat (ou son 404) et le met en cache."""
+    invalidations = cache.invalidation_count()
+    try:
+        content = await load()
+    except HTTPException as exc:
+        if exc.status_code != 404:
+            raise
+        entry = _encode_entry(404, {}, orjson.dumps(exc.detail))
+        ttl = PUBLIC_CACHE_NEGATIVE_TTL
+    else:
+        headers = {
+            name: value
+            for name, value in response.headers.items()
+            if name not in _UNCACHED_HEADERS
+        }
+        entry = _encode_entry(200, headers, model_response(model_type, content).body)
+        ttl = PUBLIC_CACHE_TTL
+    if cache.invalidation_count() == invalidations:
+        await cache.store(key, entry, ttl, tags)
+    return entry
+
+
+async def cached_response(
+    request: Request,
+    response: Response,
+    model_type: Any,
+    load: Callable[[], Awaitable[Any]],
+    *tags: str,
+) -> Response:
+    """
+    Réponse `model_response(model_type, await load(), response)`, servie
+    depuis le cache si possible. `load` lève `HTTPException(404)` si la
+    ressource n'existe pas ; `tags` sont les clés de version dont dépend le
+    résultat. À appeler après `conditional_get` sur les mêmes clés, dont
+    l'ETag entre dans la clé de cache.
+
+    En cas d'échec de cache, les requêtes identiques simultanées (même clé)
+    attendent un seul appel à `load`, borné à `PUBLIC_LOAD_TIMEOUT` secondes
+    (504 pour toutes au-delà). Les mesures sont rangées par gabarit de route
+    (`/shops/retrieve-shop/{shop_id}`...).
+    """
+    key = f"{request.url.path}?{request.url.query}"
+    etag = getattr(request.state, "etag", None)
+    if etag is not None:
+        key = f"{key}#{etag}"
+    entry = await cache.fetch(key)
+    if entry is not None:
+        metrics.incr("http_cache.hit")
+        return _entry_response(entry, response)
+
+    route = request.scope["route"].path
+    task = _inflight.get(key)
+    if task is None:
+        metrics.incr(f"http_cache.miss:{route}")
+        task = asyncio.create_task(
+            _timed_load(route, _load_entry(key, response, model_type, load, tags))
+        )
+        _inflight[key] = task
+        task.add_done_callback(lambda _: _inflight.pop(key, None))
+    else:
+        metrics.incr(f"http_cache.coalesced:{route}")
+    # shield : un client qui abandonne n'annule pas l'appel partagé
+    return _entry_response(await asyncio.shield(task), response)
+
+
+async def _timed_load(route: str, load_entry: Awaitable[bytes]) -> bytes:
+    started = time.perf_counter()
+    try:
+        return await asyncio.wait_for(load_entry, PUBLIC_LOAD_TIMEOUT)
+    except asyncio.TimeoutError:
+        metrics.incr(f"http_cache.load_timeout:{route}")
+        raise HTTPException(
+            status_code=504, detail="Délai dépassé, veuillez réessayer."
+        )
+    finally:
+        metrics.observe(f"http_cache.load:{route}", time.perf_counter() - started)
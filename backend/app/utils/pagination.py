@@ -0,0 +1,161 @@
+"""
+Pagination par curseur (keyset) partagée par les routes de liste.
+
+Un curseur est un jeton opaque encodant le couple `(clé de tri, _id)` du
+dernier élément renvoyé. La page suivante filtre directement sur ce couple
+(`clé < v OU (clé == v ET _id < id)`) au lieu de faire un `skip` : le coût
+d'une page reste constant quelle que soit sa profondeur, à condition qu'un
+index couvre `(clé de tri, _id)` (voir `app/db/indexes.py`).
+
+Pour ne pas casser le contrat des routes existantes (qui renvoient des
+listes), le curseur suivant est transmis dans l'en-tête `X-Next-Cursor`
+(absent sur la dernière page) et la taille de page dans `X-Limit`.
+"""
+
+import base64
+from datetime import datetime
+from typing import Any, List, Optional, Tuple
+
+from bson import ObjectId, json_util
+from fastapi import HTTPException, Query, Response
+from pymongo import DESCENDING
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+LIMIT_HEADER = "X-Limit"
+# Types admis pour la clé de tri d'un curseur (`None` : champ absent du
+# dernier élément). Tout le reste (document, tableau, regex...) est refusé.
+_SORT_VALUE_TYPES = (datetime, str, int, float, ObjectId, type(None))
+
+
+class PageParams:
+    """
+    Dépendance FastAPI pour les paramètres `cursor` et `limit`.
+    Utiliser `page_params(default, maximum)` pour l'adapter à chaque route.
+    """
+
+    def __init__(self, cursor: Optional[str], limit: int):
+        self.cursor = cursor
+        self.limit = limit
+
+
+def page_params(default: int = 50, maximum: int = 200):
+    def dependency(
+        cursor: Optional[str] = Query(None, description="Curseur de page opaque"),
+        limit: int = Query(default, ge=1, le=maximum),
+    ) -> PageParams:
+        return PageParams(cursor, limit)
+
+    return dependency
+
+
+def encode_cursor(sort_value: Any, last_id: ObjectId) -> str:
+    raw = json_util.dumps([sort_value, last_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[Any, ObjectId]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        sort_value, last_id = json_util.loads(base64.urlsafe_b64decode(padded))
+        if not isinstance(last_id, ObjectId):
+            raise ValueError
+        if isinstance(sort_value, bool) or not isinstance(
+            sort_value, _SORT_VALUE_TYPES
+        ):
+            raise ValueError
+        return sort_value, last_id
+    except Exception:
+        raise HTTPException(status_code=400, detail="Curseur de pagination invalide")
+
+
+def _get_path(document: dict, path: str) -> Any:
+    value = document
+    for part in path.split("."):
+        value = value.get(part) if isinstance(value, dict) else None
+    return value
+
+
+def sort_spec(sort_field: str = "_id", direction: int = DESCENDING) -> List[tuple]:
+    """Tri stable : la clé demandée puis `_id` dans le même sens."""
+    if sort_field == "_id":
+        return [("_id", direction)]
+    return [(sort_field, direction), ("_id", direction)]
+
+
+def keyset_filter(
+    cursor: Optional[str], sort_field: str = "_id", direction: int = DESCENDING
+) -> dict:
+    """Filtre Mongo sélectionnant les éléments situés après le curseur."""
+    if not cursor:
+        return {}
+    sort_value, last_id = decode_cursor(cursor)
+    op = "$lt" if direction == DESCENDING else "$gt"
+    if sort_field == "_id":
+        return {"_id": {op: last_id}}
+    return {
+        "$or": [
+            {sort_field: {op: sort_value}},
+            {sort_field: sort_value, "_id": {op: last_id}},
+        ]
+    }
+
+
+def keyset_stages(
+    params: PageParams, sort_field: str = "_id", direction: int = DESCENDING
+) -> List[dict]:
+    """
+    Étapes `$match`/`$sort` à placer en tête d'un pipeline d'agrégation.
+    Le `$limit` (`limit_stage`) se place juste après, ou après les étapes qui
+    filtrent encore des documents (ex. propriétaire actif), pour que les
+    `$lookup` ne portent que sur la page demandée.
+    """
+    stages = []
+    after = keyset_filter(params.cursor, sort_field, direction)
+    if after:
+        stages.append({"$match": after})
+    stages.append({"$sort": dict(sort_spec(sort_field, direction))})
+    return stages
+
+
+def limit_stage(params: PageParams) -> dict:
+    # On lit `limit + 1` éléments pour savoir s'il existe une page suivante
+    return {"$limit": params.limit + 1}
+
+
+def find_page(
+    collection,
+    query: dict,
+    params: PageParams,
+    sort_field: str = "_id",
+    direction: int = DESCENDING,
+    projection: Optional[dict] = None,
+):
+    """Curseur Motor d'une page (`limit + 1` éléments) pour une requête `find`."""
+    after = keyset_filter(params.cursor, sort_field, direction)
+    full_query = {"$and": [query, after]} if query and after else query or after
+    return (
+        collection.find(full_query, projection)
+        .sort(sort_spec(sort_field, direction))
+        .limit(params.limit + 1)
+    )
+
+
+def finalize_page(
+    items: List[dict],
+    params: PageParams,
+    response: Response,
+    sort_field: str = "_id",
+) -> List[dict]:
+    """
+    Tronque la page à `limit` éléments et pose les en-têtes de pagination.
+    À appeler avant toute conversion des `_id` en chaînes.
+    """
+    response.headers[LIMIT_HEADER] = str(params.limit)
+    if len(items) <= params.limit:
+        return items
+    items = items[: params.limit]
+    last = items[-1]
+    response.headers[NEXT_CURSOR_HEADER] = encode_cursor(
+        _get_path(last, sort_field), last["_id"]
+    )
+    return items
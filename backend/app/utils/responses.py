@@ -0,0 +1,55 @@
+"""
+Sérialisation rapide des réponses JSON.
+
+- `MongoJSONResponse` (classe de réponse par défaut de l'application) encode
+  avec orjson et sait sérialiser directement `ObjectId` et `datetime` ;
+- `model_response` valide et sérialise une liste (ou un objet) de documents
+  MongoDB en une seule passe `TypeAdapter`, côté Rust : plus besoin de
+  convertir chaque `_id` en chaîne à la main, d'appeler `model_validate`
+  élément par élément, puis de laisser FastAPI revalider le tout via
+  `response_model`. Les schémas acceptent les `ObjectId` tels quels.
+
+Les routes qui renvoient `model_response(...)` gardent leur `response_model`
+pour la documentation OpenAPI.
+"""
+
+from functools import lru_cache
+from typing import Any, Optional
+
+import orjson
+from bson import ObjectId
+from fastapi import Response
+from fastapi.responses import ORJSONResponse
+from pydantic import TypeAdapter
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, ObjectId):
+        return str(value)
+    raise TypeError(f"Type non sérialisable : {type(value).__name__}")
+
+
+class MongoJSONResponse(ORJSONResponse):
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+
+
+@lru_cache(maxsize=None)
+def _adapter(model_type: Any) -> TypeAdapter:
+    return TypeAdapter(model_type)
+
+
+def model_response(
+    model_type: Any, content: Any, response: Optional[Response] = None
+) -> Response:
+    """
+    Réponse JSON de `content` validé par `model_type` (ex. `List[ShopOut]`).
+    Les en-têtes posés sur `response` (pagination, cache) sont conservés.
+    """
+    adapter = _adapter(model_type)
+    body = adapter.dump_json(adapter.validate_python(content), by_alias=True)
+    return Response(
+        content=body,
+        media_type="application/json",
+        headers=dict(response.headers) if response is not None else None,
+    )